@@ -3,7 +3,6 @@
 import json
 import uuid
 from datetime import date, datetime, timedelta
-from io import BytesIO
 from typing import Any
 
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile
@@ -40,7 +39,8 @@ from app.models import (
 )
 from app.services.import_service import (
     ImportResult,
-    import_samples_from_csv,
+    import_samples_from_dataframe,
+    parse_csv,
     preview_csv,
 )
 from app.services.minio_service import MinIOService
@@ -362,8 +362,9 @@ async def preview_import_csv(
         )
 
     try:
-        content = await file.read()
-        preview = preview_csv(BytesIO(content))
+        # Parse straight from the spooled upload; pandas reads it in large
+        # buffered chunks, so there is no need for an extra in-memory copy
+        preview = preview_csv(file.file)
         return CSVPreviewResponse(
             total_rows=preview.total_rows,
             columns=preview.columns,
@@ -371,6 +372,7 @@ async def preview_import_csv(
             has_tags_column=preview.has_tags_column,
             image_count=preview.image_count,
             annotation_count=preview.annotation_count,
+            is_estimate=preview.is_estimate,
         )
     except Exception as e:
         raise HTTPException(
@@ -414,13 +416,10 @@ async def import_samples(
             detail="MinIO instance not found",
         )
 
-    # Read CSV content
-    content = await file.read()
-
-    # Get total rows for task tracking
+    # Parse once; the row count and the import share the same DataFrame
     try:
-        preview = preview_csv(BytesIO(content))
-        total_rows = preview.total_rows
+        df = parse_csv(file.file)
+        total_rows = len(df)
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -441,9 +440,9 @@ async def import_samples(
 
     try:
         # Process import synchronously (will be async with Redis in future)
-        result: ImportResult = import_samples_from_csv(
+        result: ImportResult = import_samples_from_dataframe(
             session=session,
-            file=BytesIO(content),
+            df=df,
             minio_instance_id=minio_instance_id,
             owner_id=current_user.id,
             validate_files=validate_files,
@@ -3,11 +3,12 @@
 import logging
 import os
 import uuid
+from collections.abc import Callable
 from datetime import datetime
 from typing import Any
 
 from fastapi import APIRouter, HTTPException, Request
-from sqlmodel import select
+from sqlmodel import col, delete, select, update
 
 from app.api.deps import SessionDep
 from app.models import (
@@ -29,21 +30,28 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
 # Image file extensions
-IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"}
+IMAGE_EXTENSIONS: frozenset[str] = frozenset(
+    {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"}
+)
 # Annotation file extensions
-ANNOTATION_EXTENSIONS = {".xml"}
+ANNOTATION_EXTENSIONS: frozenset[str] = frozenset({".xml"})
+
+
+# Maps a lowercase extension to the kind of file used for event dispatch
+_FILE_KINDS: dict[str, str] = {
+    **dict.fromkeys(IMAGE_EXTENSIONS, "image"),
+    **dict.fromkeys(ANNOTATION_EXTENSIONS, "annotation"),
+}
 
 
-def _is_image_file(object_key: str) -> bool:
-    """Check if the object is an image file."""
-    ext = os.path.splitext(object_key.lower())[1]
-    return ext in IMAGE_EXTENSIONS
+def _file_kind(object_key: str) -> str | None:
+    """Return "image", "annotation" or None for other files."""
+    return _FILE_KINDS.get(os.path.splitext(object_key.lower())[1])
 
 
-def _is_annotation_file(object_key: str) -> bool:
-    """Check if the object is an annotation file."""
-    ext = os.path.splitext(object_key.lower())[1]
-    return ext in ANNOTATION_EXTENSIONS
+def _event_category(event_name: str) -> str:
+    """Reduce an S3 event name to its category, e.g. "s3:ObjectRemoved"."""
+    return ":".join(event_name.split(":", 2)[:2])
 
 
 def get_minio_client(instance: MinIOInstance) -> Any:
@@ -83,7 +91,7 @@ def find_and_link_annotation(
         objects = client.list_objects(sample.bucket, recursive=True)
 
         for obj in objects:
-            if not _is_annotation_file(obj.object_name):
+            if _file_kind(obj.object_name) != "annotation":
                 continue
 
             obj_stem = extract_file_stem(obj.object_name)
@@ -168,7 +176,7 @@ async def receive_minio_webhook(
 
     # Process events
     records = payload.get("Records", [])
-    processed = 0
+    sample_ids: list[uuid.UUID] = []
 
     for record in records:
         event_name = record.get("eventName", "")
@@ -182,43 +190,21 @@ async def receive_minio_webhook(
         if not bucket or not object_key:
             continue
 
-        # Handle object created events
-        if event_name.startswith("s3:ObjectCreated"):
-            if _is_image_file(object_key):
-                processed += _handle_image_created(
-                    session=session,
-                    instance=instance,
-                    bucket=bucket,
-                    object_key=object_key,
-                    object_info=object_info,
-                )
-            elif _is_annotation_file(object_key):
-                processed += _handle_annotation_created(
-                    session=session,
-                    instance=instance,
-                    bucket=bucket,
-                    object_key=object_key,
-                    object_info=object_info,
-                )
-
-        # Handle object removed events
-        elif event_name.startswith("s3:ObjectRemoved"):
-            if _is_image_file(object_key):
-                processed += _handle_image_removed(
-                    session=session,
-                    instance=instance,
-                    bucket=bucket,
-                    object_key=object_key,
-                )
-            elif _is_annotation_file(object_key):
-                processed += _handle_annotation_removed(
-                    session=session,
-                    instance=instance,
-                    bucket=bucket,
-                    object_key=object_key,
-                )
-
-    return {"processed": processed}
+        handler = _EVENT_HANDLERS.get(
+            (_event_category(event_name), _file_kind(object_key))
+        )
+        if handler is None:
+            continue
+
+        sample_ids += handler(
+            session=session,
+            instance=instance,
+            bucket=bucket,
+            object_key=object_key,
+            object_info=object_info,
+        )
+
+    return {"processed": len(sample_ids), "sample_ids": sample_ids}
 
 
 def _handle_image_created(
@@ -226,8 +212,8 @@ def _handle_image_created(
     instance: MinIOInstance,
     bucket: str,
     object_key: str,
-    object_info: dict,
-) -> int:
+    object_info: dict[str, Any],
+) -> list[uuid.UUID]:
     """Handle image file created event with Phase 3 enhancements."""
     # Extract file hash from ETag
     etag = object_info.get("eTag", "").strip('"')
@@ -244,7 +230,7 @@ def _handle_image_created(
         ).first()
         if existing_by_hash:
             logger.info(f"Skipping duplicate image by hash: {object_key}")
-            return 0
+            return []
 
     # Check if sample already exists by path
     existing = session.exec(
@@ -268,8 +254,8 @@ def _handle_image_created(
 
             # Try to find annotation
             find_and_link_annotation(session, existing, instance)
-            return 1
-        return 0
+            return [existing.id]
+        return []
 
     # Extract file_stem for annotation matching
     file_stem = extract_file_stem(object_key)
@@ -308,7 +294,7 @@ def _handle_image_created(
     # Try to find and link annotation
     find_and_link_annotation(session, sample, instance)
 
-    return 1
+    return [sample.id]
 
 
 def _handle_annotation_created(
@@ -316,8 +302,8 @@ def _handle_annotation_created(
     instance: MinIOInstance,
     bucket: str,
     object_key: str,
-    object_info: dict,
-) -> int:
+    object_info: dict[str, Any],
+) -> list[uuid.UUID]:
     """Handle annotation file created event."""
     # Extract file stem to find matching image
     file_stem = extract_file_stem(object_key)
@@ -336,14 +322,14 @@ def _handle_annotation_created(
     if not sample:
         # No matching image, ignore annotation
         logger.info(f"No matching image for annotation: {object_key}")
-        return 0
+        return []
 
     # Check if sample already has an annotation
     if sample.annotation_status == AnnotationStatus.linked:
         # Check if it's the same annotation (by hash)
         if sample.annotation_hash == annotation_hash:
             logger.info(f"Skipping duplicate annotation by hash: {object_key}")
-            return 0
+            return []
 
         # Different annotation - mark as conflict
         sample.annotation_status = AnnotationStatus.conflict
@@ -363,7 +349,7 @@ def _handle_annotation_created(
         )
         session.add(history)
         session.commit()
-        return 1
+        return [sample.id]
 
     # No existing annotation - link it
     try:
@@ -407,19 +393,19 @@ def _handle_annotation_created(
             )
             session.add(history)
             session.commit()
-            return 1
+            return [sample.id]
         else:
             sample.annotation_status = AnnotationStatus.error
             session.add(sample)
             session.commit()
-            return 0
+            return []
 
     except Exception as e:
         logger.warning(f"Failed to parse annotation {object_key}: {e}")
         sample.annotation_status = AnnotationStatus.error
         session.add(sample)
         session.commit()
-        return 0
+        return []
 
 
 def _handle_image_removed(
@@ -427,36 +413,38 @@ def _handle_image_removed(
     instance: MinIOInstance,
     bucket: str,
     object_key: str,
-) -> int:
+    object_info: dict[str, Any],  # noqa: ARG001 - shared handler signature
+) -> list[uuid.UUID]:
     """Handle image file removed event."""
-    sample = session.exec(
-        select(Sample).where(
-            Sample.minio_instance_id == instance.id,
-            Sample.bucket == bucket,
-            Sample.object_key == object_key,
+    # Soft delete in a single UPDATE ... RETURNING, without loading the row
+    now = datetime.utcnow()
+    statement = (
+        update(Sample)
+        .where(
+            col(Sample.minio_instance_id) == instance.id,
+            col(Sample.bucket) == bucket,
+            col(Sample.object_key) == object_key,
         )
-    ).first()
+        .values(status=SampleStatus.deleted, deleted_at=now, updated_at=now)
+        .returning(col(Sample.id))
+    )
+    sample_ids = session.execute(statement).scalars().all()
 
-    if not sample:
-        return 0
-
-    # Soft delete the sample
-    sample.status = SampleStatus.deleted
-    sample.deleted_at = datetime.utcnow()
-    sample.updated_at = datetime.utcnow()
-    session.add(sample)
-    session.commit()
+    if not sample_ids:
+        return []
 
     # Add history record
-    history = SampleHistory(
-        sample_id=sample.id,
-        action=SampleHistoryAction.deleted,
-        details={"source": "webhook", "event": "s3:ObjectRemoved"},
-    )
-    session.add(history)
+    for sample_id in sample_ids:
+        session.add(
+            SampleHistory(
+                sample_id=sample_id,
+                action=SampleHistoryAction.deleted,
+                details={"source": "webhook", "event": "s3:ObjectRemoved"},
+            )
+        )
     session.commit()
 
-    return 1
+    return list(sample_ids)
 
 
 def _handle_annotation_removed(
@@ -464,42 +452,56 @@ def _handle_annotation_removed(
     instance: MinIOInstance,
     bucket: str,
     object_key: str,
-) -> int:
+    object_info: dict[str, Any],  # noqa: ARG001 - shared handler signature
+) -> list[uuid.UUID]:
     """Handle annotation file removed event."""
-    # Find sample with this annotation
-    sample = session.exec(
-        select(Sample).where(
-            Sample.minio_instance_id == instance.id,
-            Sample.bucket == bucket,
-            Sample.annotation_key == object_key,
+    # Clear the annotation link on every sample pointing at this file
+    statement = (
+        update(Sample)
+        .where(
+            col(Sample.minio_instance_id) == instance.id,
+            col(Sample.bucket) == bucket,
+            col(Sample.annotation_key) == object_key,
         )
-    ).first()
+        .values(
+            annotation_key=None,
+            annotation_hash=None,
+            annotation_status=AnnotationStatus.none,
+            annotation_id=None,
+            updated_at=datetime.utcnow(),
+        )
+        .returning(col(Sample.id))
+    )
+    sample_ids = session.execute(statement).scalars().all()
 
-    if not sample:
-        return 0
+    if not sample_ids:
+        return []
 
-    # Delete the Annotation record if exists
-    annotation = session.exec(
-        select(Annotation).where(Annotation.sample_id == sample.id)
-    ).first()
-    if annotation:
-        session.delete(annotation)
-
-    # Clear annotation fields from sample
-    sample.annotation_key = None
-    sample.annotation_hash = None
-    sample.annotation_status = AnnotationStatus.none
-    sample.annotation_id = None
-    sample.updated_at = datetime.utcnow()
-    session.add(sample)
+    # Delete the Annotation records of those samples
+    session.execute(delete(Annotation).where(col(Annotation.sample_id).in_(sample_ids)))
 
     # Add history record
-    history = SampleHistory(
-        sample_id=sample.id,
-        action=SampleHistoryAction.annotation_removed,
-        details={"source": "webhook", "event": "s3:ObjectRemoved", "annotation": object_key},
-    )
-    session.add(history)
+    for sample_id in sample_ids:
+        session.add(
+            SampleHistory(
+                sample_id=sample_id,
+                action=SampleHistoryAction.annotation_removed,
+                details={
+                    "source": "webhook",
+                    "event": "s3:ObjectRemoved",
+                    "annotation": object_key,
+                },
+            )
+        )
     session.commit()
 
-    return 1
+    return list(sample_ids)
+
+
+# (event category, file kind) -> handler; events for other files are ignored
+_EVENT_HANDLERS: dict[tuple[str, str | None], Callable[..., list[uuid.UUID]]] = {
+    ("s3:ObjectCreated", "image"): _handle_image_created,
+    ("s3:ObjectCreated", "annotation"): _handle_annotation_created,
+    ("s3:ObjectRemoved", "image"): _handle_image_removed,
+    ("s3:ObjectRemoved", "annotation"): _handle_annotation_removed,
+}
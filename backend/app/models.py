@@ -1096,6 +1096,7 @@ class CSVPreviewResponse(SQLModel):
     has_tags_column: bool
     image_count: int
     annotation_count: int
+    is_estimate: bool = False
 
 
 class ImportStartRequest(SQLModel):
@@ -1,7 +1,16 @@
 """Annotation service for parsing VOC XML files."""
 
 from dataclasses import dataclass
-from xml.etree import ElementTree as ET
+from io import BytesIO
+
+from lxml import etree as ET
+
+# Only the leaves parse_voc_xml needs; everything else is skipped while streaming
+_STREAM_TAGS = ("filename", "width", "height", "object")
+# Compiled once; evaluated per object
+_BOX_XPATH = ET.XPath(
+    "./bndbox/*[self::xmin or self::ymin or self::xmax or self::ymax]"
+)
 
 
 @dataclass
@@ -16,6 +25,12 @@ class ParsedAnnotation:
     objects: list[dict]
 
 
+def _is_top_level(elem: ET._Element) -> bool:
+    """Whether ``elem`` is a direct child of the document root."""
+    parent = elem.getparent()
+    return parent is not None and parent.getparent() is None
+
+
 def parse_voc_xml(xml_content: bytes) -> ParsedAnnotation | None:
     """Parse VOC/Pascal XML annotation file.
 
@@ -25,69 +40,69 @@ def parse_voc_xml(xml_content: bytes) -> ParsedAnnotation | None:
     Returns:
         ParsedAnnotation object or None if parsing fails
     """
+    filename = ""
+    image_width = 0
+    image_height = 0
+    objects = []
+    class_counts: dict[str, int] = {}
+
     try:
-        root = ET.fromstring(xml_content)
-
-        # Extract filename
-        filename_elem = root.find("filename")
-        filename = filename_elem.text if filename_elem is not None else ""
-
-        # Extract image size
-        size_elem = root.find("size")
-        image_width = 0
-        image_height = 0
-        if size_elem is not None:
-            width_elem = size_elem.find("width")
-            height_elem = size_elem.find("height")
-            image_width = int(width_elem.text) if width_elem is not None else 0
-            image_height = int(height_elem.text) if height_elem is not None else 0
-
-        # Extract objects
-        objects = []
-        class_counts: dict[str, int] = {}
-
-        for obj in root.findall("object"):
-            name_elem = obj.find("name")
-            if name_elem is None:
-                continue
-
-            class_name = name_elem.text
-
-            bndbox = obj.find("bndbox")
-            if bndbox is None:
-                continue
-
-            xmin_elem = bndbox.find("xmin")
-            ymin_elem = bndbox.find("ymin")
-            xmax_elem = bndbox.find("xmax")
-            ymax_elem = bndbox.find("ymax")
-
-            if (
-                xmin_elem is not None
-                and ymin_elem is not None
-                and xmax_elem is not None
-                and ymax_elem is not None
-            ):
-                obj_dict = {
-                    "class": class_name,
-                    "xmin": int(xmin_elem.text),  # type: ignore
-                    "ymin": int(ymin_elem.text),  # type: ignore
-                    "xmax": int(xmax_elem.text),  # type: ignore
-                    "ymax": int(ymax_elem.text),  # type: ignore
-                }
-                objects.append(obj_dict)
-
-                # Update class counts
-                class_counts[class_name] = class_counts.get(class_name, 0) + 1
-
-        return ParsedAnnotation(
-            filename=filename,
-            image_width=image_width,
-            image_height=image_height,
-            object_count=len(objects),
-            class_counts=class_counts,
-            objects=objects,
-        )
-
-    except ET.ParseError:
+        # Stream the document instead of building a full tree; no entity
+        # expansion or network access for uploaded XML
+        for _, elem in ET.iterparse(
+            BytesIO(xml_content),
+            events=("end",),
+            tag=_STREAM_TAGS,
+            huge_tree=False,
+            resolve_entities=False,
+            no_network=True,
+        ):
+            parent = elem.getparent()
+
+            # Like root.find()/findall(), only read direct children of the
+            # root (and of its <size>); nested matches are ignored
+            if elem.tag == "object":
+                if not _is_top_level(elem):
+                    continue
+                name_elem = elem.find("name")
+                # One XPath evaluation yields all four coordinates, keyed by
+                # tag so the order of bndbox children doesn't matter
+                coords = {e.tag: e.text for e in _BOX_XPATH(elem)}
+                if name_elem is not None and len(coords) == 4:
+                    class_name = name_elem.text
+                    objects.append(
+                        {
+                            "class": class_name,
+                            "xmin": int(coords["xmin"]),
+                            "ymin": int(coords["ymin"]),
+                            "xmax": int(coords["xmax"]),
+                            "ymax": int(coords["ymax"]),
+                        }
+                    )
+                    class_counts[class_name] = class_counts.get(class_name, 0) + 1
+
+                # Free the object and everything already consumed before it
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+            elif elem.tag == "filename":
+                if _is_top_level(elem):
+                    filename = elem.text
+            elif parent is not None and parent.tag == "size" and _is_top_level(parent):
+                if elem.tag == "width":
+                    image_width = int(elem.text)
+                else:
+                    image_height = int(elem.text)
+
+    except ET.XMLSyntaxError:
         return None
+
+    return ParsedAnnotation(
+        filename=filename,
+        image_width=image_width,
+        image_height=image_height,
+        object_count=len(objects),
+        class_counts=class_counts,
+        objects=objects,
+    )
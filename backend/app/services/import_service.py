@@ -1,11 +1,14 @@
 """Import service for batch importing samples from CSV/Excel."""
 
+import re
 import uuid
 from dataclasses import dataclass, field
-from typing import BinaryIO
+from datetime import datetime
+from typing import Any, BinaryIO
 
 import pandas as pd
-from sqlmodel import Session, select
+from sqlalchemy import insert
+from sqlmodel import Session, col, select
 
 from app.models import (
     Annotation,
@@ -25,9 +28,24 @@ from app.services.matching_service import extract_file_stem
 from app.services.minio_service import MinIOService
 
 # Image file extensions
-IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tiff", ".tif"}
+IMAGE_EXTENSIONS: frozenset[str] = frozenset(
+    {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tiff", ".tif"}
+)
 # Annotation file extensions
-ANNOTATION_EXTENSIONS = {".xml"}
+ANNOTATION_EXTENSIONS: frozenset[str] = frozenset({".xml"})
+
+
+def _extension_alternation(extensions: frozenset[str]) -> str:
+    return "|".join(re.escape(ext) for ext in sorted(extensions))
+
+
+# Classifies an object key by its final extension in one C-level match;
+# derived from the sets above so they stay the single source of truth
+_EXT_RE = re.compile(
+    rf"(?P<image>{_extension_alternation(IMAGE_EXTENSIONS)})$"
+    rf"|(?P<annotation>{_extension_alternation(ANNOTATION_EXTENSIONS)})$",
+    re.IGNORECASE,
+)
 
 
 @dataclass
@@ -52,45 +70,160 @@ class CSVPreview:
     has_tags_column: bool
     image_count: int
     annotation_count: int
+    is_estimate: bool = False
+
 
+def _estimate_scale(file: BinaryIO, rows_read: int) -> float | None:
+    """Ratio of total data rows to ``rows_read``, or None if nothing remains.
 
-def preview_csv(file: BinaryIO) -> CSVPreview:
+    Measures the bytes taken by the header and the first ``rows_read`` lines
+    and extrapolates over the remaining file size (rows-per-byte).
+    """
+    file.seek(0)
+    header_bytes = len(file.readline())
+    sample_bytes = sum(len(file.readline()) for _ in range(rows_read))
+    if not sample_bytes or not file.readline().strip():
+        return None
+
+    data_bytes = file.seek(0, 2) - header_bytes
+    return data_bytes / sample_bytes
+
+
+def preview_csv(file: BinaryIO, max_preview_rows: int | None = 10_000) -> CSVPreview:
     """Preview CSV file content for import.
 
+    Only the first ``max_preview_rows`` rows are parsed. For larger files the
+    row and category counts are extrapolated from the bytes scanned and the
+    preview is flagged with ``is_estimate``.
+
     Args:
         file: CSV file to preview
+        max_preview_rows: Row cap for the preview pass, None to parse everything
 
     Returns:
         CSVPreview with file statistics
     """
-    df = pd.read_csv(file)
+    df = pd.read_csv(file, nrows=max_preview_rows)
+
+    scale = None
+    if max_preview_rows is not None and len(df) == max_preview_rows:
+        scale = _estimate_scale(file, max_preview_rows)
     file.seek(0)  # Reset file pointer for later use
 
     columns = list(df.columns)
     has_tags = "tags" in columns
 
-    # Count images and annotations
+    # Count images and annotations with vectorized string ops (no per-row loop)
     image_count = 0
     annotation_count = 0
 
     if "object_key" in columns:
-        for key in df["object_key"]:
-            ext = "." + str(key).split(".")[-1].lower() if "." in str(key) else ""
-            if ext in IMAGE_EXTENSIONS:
-                image_count += 1
-            elif ext in ANNOTATION_EXTENSIONS:
-                annotation_count += 1
+        matches = df["object_key"].astype(str).str.extract(_EXT_RE)
+        image_count = int(matches["image"].notna().sum())
+        annotation_count = int(matches["annotation"].notna().sum())
+
+    total_rows = len(df)
+    if scale is not None:
+        total_rows = round(total_rows * scale)
+        image_count = round(image_count * scale)
+        annotation_count = round(annotation_count * scale)
 
     return CSVPreview(
-        total_rows=len(df),
+        total_rows=total_rows,
         columns=columns,
         sample_rows=df.head(5).to_dict(orient="records"),
         has_tags_column=has_tags,
         image_count=image_count,
         annotation_count=annotation_count,
+        is_estimate=scale is not None,
     )
 
 
+def bulk_get_or_create_tags(
+    session: Session,
+    owner_id: uuid.UUID,
+    tag_paths: list[str],
+    tag_cache: dict[str, uuid.UUID],
+) -> dict[str, uuid.UUID]:
+    """Get or create tags for many hierarchical paths at once.
+
+    Paths are resolved one hierarchy level at a time: a single SELECT finds
+    the existing tags for every uncached path at that depth and the missing
+    ones are inserted with a single flush, so the number of roundtrips grows
+    with the tag depth rather than with the number of paths.
+
+    Args:
+        session: Database session
+        owner_id: Owner user ID
+        tag_paths: Tag paths (e.g., ["输电/山火", "已标注"])
+        tag_cache: Cache of already processed tag paths to IDs
+
+    Returns:
+        Mapping of each stripped, non-empty input path to its tag UUID
+    """
+    # Uncached path prefixes grouped by depth, as (parent path, tag name)
+    levels: list[dict[str, tuple[str | None, str]]] = []
+    normalized: dict[str, str] = {}
+
+    for tag_path in tag_paths:
+        tag_path = tag_path.strip()
+        if tag_path in normalized:
+            continue
+
+        parts = [part.strip() for part in tag_path.split("/") if part.strip()]
+        if not parts:
+            continue
+
+        parent_path = None
+        for depth, part in enumerate(parts):
+            current_path = f"{parent_path}/{part}" if parent_path else part
+            if depth == len(levels):
+                levels.append({})
+            if current_path not in tag_cache:
+                levels[depth][current_path] = (parent_path, part)
+            parent_path = current_path
+        normalized[tag_path] = current_path
+
+    for depth, pending in enumerate(levels):
+        if not pending:
+            continue
+
+        if depth == 0:
+            parent_filter = Tag.parent_id.is_(None)  # type: ignore[union-attr]
+        else:
+            parent_ids = {tag_cache[parent] for parent, _ in pending.values() if parent}
+            parent_filter = Tag.parent_id.in_(parent_ids)  # type: ignore[union-attr]
+
+        existing: dict[tuple[uuid.UUID | None, str], uuid.UUID] = {}
+        rows = session.exec(
+            select(Tag.id, Tag.name, Tag.parent_id).where(
+                Tag.owner_id == owner_id,
+                Tag.name.in_({name for _, name in pending.values()}),  # type: ignore[attr-defined]
+                parent_filter,
+            )
+        ).all()
+        for tag_id, name, parent_id in rows:
+            existing.setdefault((parent_id, name), tag_id)
+
+        created = False
+        for current_path, (parent_path, name) in pending.items():
+            parent_id = tag_cache[parent_path] if parent_path else None
+            existing_id = existing.get((parent_id, name))
+            if existing_id is not None:
+                tag_cache[current_path] = existing_id
+                continue
+            # IDs are generated client-side, so no RETURNING is needed
+            new_tag = Tag(name=name, parent_id=parent_id, owner_id=owner_id)
+            session.add(new_tag)
+            tag_cache[current_path] = new_tag.id
+            created = True
+
+        if created:
+            session.flush()  # One batched INSERT per level
+
+    return {path: tag_cache[current] for path, current in normalized.items()}
+
+
 def get_or_create_tag_by_path(
     session: Session,
     owner_id: uuid.UUID,
@@ -112,52 +245,75 @@ def get_or_create_tag_by_path(
     if tag_path in tag_cache:
         return tag_cache[tag_path]
 
-    parts = tag_path.split("/")
-    parent_id = None
-    current_path = ""
+    tag_ids = bulk_get_or_create_tags(session, owner_id, [tag_path], tag_cache)
+    return tag_ids.get(tag_path)  # type: ignore
 
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
 
-        current_path = f"{current_path}/{part}" if current_path else part
+def _insert_image_rows(
+    session: Session,
+    owner_id: uuid.UUID,
+    sample_rows: list[dict[str, Any]],
+    batch_tags: list[tuple[uuid.UUID, list[str]]],
+    tag_cache: dict[str, uuid.UUID],
+) -> None:
+    """Insert samples with their history and tag links as multi-row INSERTs."""
+    session.execute(insert(Sample), sample_rows)
+    # Record history
+    session.execute(
+        insert(SampleHistory),
+        [
+            {
+                "id": uuid.uuid4(),
+                "sample_id": sample_row["id"],
+                "action": SampleHistoryAction.created,
+                "details": {"source": "csv_import"},
+                "created_at": sample_row["created_at"],
+            }
+            for sample_row in sample_rows
+        ],
+    )
 
-        if current_path in tag_cache:
-            parent_id = tag_cache[current_path]
-            continue
+    if not batch_tags:
+        return
 
-        # Find existing tag
-        if parent_id:
-            query = select(Tag).where(
-                Tag.owner_id == owner_id,
-                Tag.name == part,
-                Tag.parent_id == parent_id,
-            )
-        else:
-            query = select(Tag).where(
-                Tag.owner_id == owner_id,
-                Tag.name == part,
-                Tag.parent_id.is_(None),  # type: ignore[union-attr]
-            )
-        existing_tag = session.exec(query).first()
+    tag_ids = bulk_get_or_create_tags(
+        session,
+        owner_id,
+        [tag_path for _, tag_paths in batch_tags for tag_path in tag_paths],
+        tag_cache,
+    )
+    # Create sample-tag associations
+    now = datetime.utcnow()
+    sample_tag_rows = [
+        {"sample_id": sample_id, "tag_id": tag_id, "created_at": now}
+        for sample_id, tag_paths in batch_tags
+        for tag_id in {tag_ids[p] for p in tag_paths if p in tag_ids}
+    ]
+    if sample_tag_rows:
+        session.execute(insert(SampleTag), sample_tag_rows)
 
-        if existing_tag:
-            tag_cache[current_path] = existing_tag.id
-            parent_id = existing_tag.id
-        else:
-            # Create new tag
-            new_tag = Tag(
-                name=part,
-                parent_id=parent_id,
-                owner_id=owner_id,
-            )
-            session.add(new_tag)
-            session.flush()  # Get the ID
-            tag_cache[current_path] = new_tag.id
-            parent_id = new_tag.id
 
-    return parent_id  # type: ignore
+def _restore_tag_cache(
+    tag_cache: dict[str, uuid.UUID], snapshot: dict[str, uuid.UUID]
+) -> None:
+    """Drop tags cached by a rolled-back insert; those rows no longer exist."""
+    tag_cache.clear()
+    tag_cache.update(snapshot)
+
+
+def parse_csv(file: BinaryIO) -> pd.DataFrame:
+    """Parse an import CSV into a DataFrame.
+
+    Callers that need both the row count and the import should parse once and
+    pass the DataFrame to ``import_samples_from_dataframe``.
+
+    Args:
+        file: CSV file
+
+    Returns:
+        DataFrame with one row per object
+    """
+    return pd.read_csv(file)
 
 
 def import_samples_from_csv(
@@ -182,8 +338,8 @@ def import_samples_from_csv(
     Returns:
         ImportResult with statistics
     """
-    df = pd.read_csv(file)
-    return _import_samples_from_dataframe(
+    df = parse_csv(file)
+    return import_samples_from_dataframe(
         session=session,
         df=df,
         minio_instance_id=minio_instance_id,
@@ -216,7 +372,7 @@ def import_samples_from_excel(
         ImportResult with statistics
     """
     df = pd.read_excel(file)
-    return _import_samples_from_dataframe(
+    return import_samples_from_dataframe(
         session=session,
         df=df,
         minio_instance_id=minio_instance_id,
@@ -226,7 +382,7 @@ def import_samples_from_excel(
     )
 
 
-def _import_samples_from_dataframe(
+def import_samples_from_dataframe(
     *,
     session: Session,
     df: pd.DataFrame,
@@ -276,17 +432,30 @@ def _import_samples_from_dataframe(
     annotation_rows = []
 
     for _, row in df.iterrows():
-        object_key = str(row["object_key"])
-        ext = "." + object_key.split(".")[-1].lower() if "." in object_key else ""
-        if ext in IMAGE_EXTENSIONS:
+        match = _EXT_RE.search(str(row["object_key"]))
+        kind = match.lastgroup if match else None
+        if kind == "image":
             image_rows.append(row)
-        elif ext in ANNOTATION_EXTENSIONS:
+        elif kind == "annotation":
             annotation_rows.append(row)
         # Skip other file types silently
 
     # First pass: Process images
     for i in range(0, len(image_rows), batch_size):
         batch = image_rows[i : i + batch_size]
+        candidates: list[tuple[dict[str, Any], list[str]]] = []
+
+        # One query for the rows of this batch that already exist by path
+        existing_paths = set(
+            session.exec(
+                select(Sample.bucket, Sample.object_key).where(
+                    Sample.minio_instance_id == minio_instance_id,
+                    col(Sample.object_key).in_(
+                        {str(row["object_key"]) for row in batch}
+                    ),
+                )
+            ).all()
+        )
 
         for row in batch:
             try:
@@ -297,16 +466,7 @@ def _import_samples_from_dataframe(
                     result.error_details.append(f"No bucket for: {object_key}")
                     continue
 
-                # Check if sample already exists by path
-                existing = session.exec(
-                    select(Sample).where(
-                        Sample.minio_instance_id == minio_instance_id,
-                        Sample.bucket == row_bucket,
-                        Sample.object_key == object_key,
-                    )
-                ).first()
-
-                if existing:
+                if (row_bucket, object_key) in existing_paths:
                     result.skipped += 1
                     continue
 
@@ -339,71 +499,117 @@ def _import_samples_from_dataframe(
                     file_size = int(row.get("file_size", 0)) if pd.notna(row.get("file_size")) else 0
                     content_type = str(row.get("content_type")) if pd.notna(row.get("content_type")) else None
 
-                # Check for duplicate by file_hash
-                if file_hash:
-                    existing_by_hash = session.exec(
-                        select(Sample).where(
-                            Sample.owner_id == owner_id,
-                            Sample.file_hash == file_hash,
-                        )
-                    ).first()
-                    if existing_by_hash:
-                        result.skipped += 1
-                        result.error_details.append(
-                            f"Duplicate (hash): {object_key} matches {existing_by_hash.object_key}"
-                        )
-                        continue
-
-                # Create sample
-                sample = Sample(
-                    minio_instance_id=minio_instance_id,
-                    owner_id=owner_id,
-                    bucket=row_bucket,
-                    object_key=object_key,
-                    file_name=file_name,
-                    file_stem=file_stem,
-                    file_size=file_size,
-                    file_hash=file_hash,
-                    etag=etag,
-                    content_type=content_type,
-                    source=SampleSource.import_csv,
-                    status=SampleStatus.active,
-                    annotation_status=AnnotationStatus.none,
-                )
-                session.add(sample)
-                session.flush()  # Get sample ID
-
-                # Process tags
+                # Plain row values; IDs and timestamps are set client-side so
+                # the batch goes out as one multi-row INSERT
+                now = datetime.utcnow()
+                sample_row = {
+                    "id": uuid.uuid4(),
+                    "minio_instance_id": minio_instance_id,
+                    "owner_id": owner_id,
+                    "bucket": row_bucket,
+                    "object_key": object_key,
+                    "file_name": file_name,
+                    "file_stem": file_stem,
+                    "file_size": file_size,
+                    "file_hash": file_hash,
+                    "etag": etag,
+                    "content_type": content_type,
+                    "source": SampleSource.import_csv,
+                    "status": SampleStatus.active,
+                    "annotation_status": AnnotationStatus.none,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+
+                tag_paths = []
                 if has_tags_column and pd.notna(row.get("tags")):
                     tags_str = str(row["tags"])
                     tag_paths = [t.strip() for t in tags_str.split(",") if t.strip()]
 
-                    for tag_path in tag_paths:
-                        tag_id = get_or_create_tag_by_path(
-                            session=session,
-                            owner_id=owner_id,
-                            tag_path=tag_path,
-                            tag_cache=tag_cache,
-                        )
-                        # Create sample-tag association
-                        sample_tag = SampleTag(sample_id=sample.id, tag_id=tag_id)
-                        session.add(sample_tag)
-
-                # Record history
-                history = SampleHistory(
-                    sample_id=sample.id,
-                    action=SampleHistoryAction.created,
-                    details={"source": "csv_import"},
-                )
-                session.add(history)
-
-                result.created += 1
+                candidates.append((sample_row, tag_paths))
 
             except Exception as e:
                 result.errors += 1
                 result.error_details.append(f"Error processing {row.get('object_key', 'unknown')}: {str(e)}")
 
-        session.commit()
+        # Check for duplicates by file_hash with one query for the batch
+        hashes = {c["file_hash"] for c, _ in candidates if c["file_hash"]}
+        known_hashes: dict[str, str] = {}
+        if hashes:
+            known_hashes = {
+                known_hash: known_key
+                for known_hash, known_key in session.exec(
+                    select(Sample.file_hash, Sample.object_key).where(
+                        Sample.owner_id == owner_id,
+                        col(Sample.file_hash).in_(hashes),
+                    )
+                ).all()
+                if known_hash
+            }
+
+        sample_rows: list[dict[str, Any]] = []
+        batch_tags: list[tuple[uuid.UUID, list[str]]] = []
+        for sample_row, tag_paths in candidates:
+            path = (sample_row["bucket"], sample_row["object_key"])
+            if path in existing_paths:
+                # Same path earlier in this batch
+                result.skipped += 1
+                continue
+
+            file_hash = sample_row["file_hash"]
+            if file_hash in known_hashes:
+                result.skipped += 1
+                result.error_details.append(
+                    f"Duplicate (hash): {sample_row['object_key']} matches {known_hashes[file_hash]}"
+                )
+                continue
+            if file_hash:
+                known_hashes[file_hash] = sample_row["object_key"]
+
+            sample_rows.append(sample_row)
+            existing_paths.add(path)
+            if tag_paths:
+                batch_tags.append((sample_row["id"], tag_paths))
+
+        if not sample_rows:
+            continue
+
+        cached_tags = dict(tag_cache)
+        try:
+            _insert_image_rows(session, owner_id, sample_rows, batch_tags, tag_cache)
+            session.commit()
+            result.created += len(sample_rows)
+        except Exception:
+            # Undo the batch and retry row by row, so one bad value only
+            # fails its own row
+            session.rollback()
+            _restore_tag_cache(tag_cache, cached_tags)
+            tags_by_id = dict(batch_tags)
+            for sample_row in sample_rows:
+                cached_tags = dict(tag_cache)
+                sample_id = sample_row["id"]
+                row_tags = (
+                    [(sample_id, tags_by_id[sample_id])]
+                    if sample_id in tags_by_id
+                    else []
+                )
+                try:
+                    with session.begin_nested():
+                        _insert_image_rows(
+                            session, owner_id, [sample_row], row_tags, tag_cache
+                        )
+                    result.created += 1
+                except Exception as e:
+                    _restore_tag_cache(tag_cache, cached_tags)
+                    existing_paths.discard(
+                        (sample_row["bucket"], sample_row["object_key"])
+                    )
+                    known_hashes.pop(sample_row["file_hash"], None)
+                    result.errors += 1
+                    result.error_details.append(
+                        f"Error processing {sample_row['object_key']}: {str(e)}"
+                    )
+            session.commit()
 
     # Count newly created tags
     result.tags_created = len(tag_cache)
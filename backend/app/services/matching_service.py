@@ -1,6 +1,5 @@
 """Matching service for linking images and annotation files."""
 
-import os
 from typing import Any
 
 from app.models import Sample
@@ -15,11 +14,11 @@ def extract_file_stem(filename: str) -> str:
     Returns:
         Filename without extension
     """
-    # Get basename if it's a path
-    basename = os.path.basename(filename)
-    # Remove extension
-    stem = os.path.splitext(basename)[0]
-    return stem
+    # Plain string ops: object keys always use "/" and this runs per row
+    basename = filename.rsplit("/", 1)[-1]
+    # Remove extension; a leading dot (".hidden") is not an extension
+    dot = basename.rfind(".")
+    return basename[:dot] if dot > 0 else basename
 
 
 def find_annotation_for_image(sample: Sample, minio_client: Any) -> str | None:
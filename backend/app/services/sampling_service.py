@@ -1,10 +1,12 @@
 """Sampling service for dataset building."""
 
-import random
+import functools
 from dataclasses import dataclass
 from typing import Any, TypeVar
 
-from sqlalchemy import Select, func, or_
+import numpy as np
+from sqlalchemy import TEXT, Select, bindparam, func, or_
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlmodel import col, select
 
 from app.models import (
@@ -34,61 +36,109 @@ class SamplingResult:
     total_selected: int
 
 
-def build_sample_filter_query(filters: FilterParams) -> Select:
+# FilterParams fields that map to a single bound parameter
+_FILTER_PARAMS = (
+    "date_from",
+    "date_to",
+    "annotation_status",
+    "tags_include",
+    "tags_exclude",
+    "annotation_classes",
+    "object_count_min",
+    "object_count_max",
+)
+
+
+def build_sample_filter_query(filters: FilterParams) -> Select[Any]:
     """Build a filter query for samples.
 
     Returns a SQLModel Select object that can be executed by the caller.
     This allows the service to remain session-agnostic.
+
+    The statement only depends on which filters are set, so it is built once
+    per combination with bound parameters and cached; each call just attaches
+    the filter values.
     """
+    tag_groups = [group for group in filters.tag_filter or [] if group]
+    params: dict[str, Any] = {
+        name: getattr(filters, name)
+        for name in _FILTER_PARAMS
+        if getattr(filters, name) not in (None, [])
+    }
+    for i, group in enumerate(tag_groups):
+        params[f"tag_group_{i}"] = group
+        params[f"tag_group_{i}_size"] = len(group)
+
+    template = _filter_query_template(
+        frozenset(name for name in _FILTER_PARAMS if name in params),
+        len(tag_groups),
+    )
+    return template.params(params) if params else template
+
+
+@functools.lru_cache(maxsize=256)
+def _filter_query_template(active: frozenset[str], tag_group_count: int) -> Select[Any]:
+    """Build the filter statement for a set of active filters, values unbound."""
     query = select(Sample).where(Sample.status == SampleStatus.active)
 
-    if filters.date_from:
-        query = query.where(Sample.created_at >= filters.date_from)
+    if "date_from" in active:
+        query = query.where(Sample.created_at >= bindparam("date_from"))
 
-    if filters.date_to:
-        query = query.where(Sample.created_at <= filters.date_to)
+    if "date_to" in active:
+        query = query.where(Sample.created_at <= bindparam("date_to"))
 
-    if filters.annotation_status:
-        query = query.where(Sample.annotation_status == filters.annotation_status)
+    if "annotation_status" in active:
+        query = query.where(Sample.annotation_status == bindparam("annotation_status"))
 
     # DNF tag filter: [[tagA, tagB], [tagC]] = (A AND B) OR C
-    if filters.tag_filter:
+    if tag_group_count:
         or_conditions = []
-        for tag_group in filters.tag_filter:
-            if tag_group:
-                # Each group: sample must have ALL tags in the group (AND)
-                subquery = (
-                    select(SampleTag.sample_id)
-                    .where(col(SampleTag.tag_id).in_(tag_group))
-                    .group_by(col(SampleTag.sample_id))
-                    .having(func.count(col(SampleTag.tag_id)) == len(tag_group))
+        for i in range(tag_group_count):
+            # Each group: sample must have ALL tags in the group (AND)
+            subquery = (
+                select(SampleTag.sample_id)
+                .where(
+                    col(SampleTag.tag_id).in_(
+                        bindparam(f"tag_group_{i}", expanding=True)
+                    )
+                )
+                .group_by(col(SampleTag.sample_id))
+                .having(
+                    func.count(col(SampleTag.tag_id))
+                    == bindparam(f"tag_group_{i}_size")
                 )
-                or_conditions.append(col(Sample.id).in_(subquery))
-        if or_conditions:
-            # Groups are connected by OR
-            query = query.where(or_(*or_conditions))
+            )
+            or_conditions.append(col(Sample.id).in_(subquery))
+        # Groups are connected by OR
+        query = query.where(or_(*or_conditions))
 
     # Legacy tag filters (kept for backwards compatibility)
-    if filters.tags_include:
-        query = query.join(SampleTag).where(col(SampleTag.tag_id).in_(filters.tags_include))
+    if "tags_include" in active:
+        query = query.join(SampleTag).where(
+            col(SampleTag.tag_id).in_(bindparam("tags_include", expanding=True))
+        )
 
-    if filters.tags_exclude:
-        subq = select(SampleTag.sample_id).where(col(SampleTag.tag_id).in_(filters.tags_exclude))
+    if "tags_exclude" in active:
+        subq = select(SampleTag.sample_id).where(
+            col(SampleTag.tag_id).in_(bindparam("tags_exclude", expanding=True))
+        )
         query = query.where(col(Sample.id).notin_(subq))
 
-    if filters.annotation_classes:
+    if "annotation_classes" in active:
         query = query.join(Annotation).where(
-            Annotation.class_counts.has_any(keys=filters.annotation_classes)
+            Annotation.class_counts.has_any(
+                bindparam("annotation_classes", type_=ARRAY(TEXT))
+            )
         )
 
-    if filters.object_count_min is not None:
+    if "object_count_min" in active:
         query = query.join(Annotation, isouter=True).where(
-            Annotation.object_count >= filters.object_count_min
+            Annotation.object_count >= bindparam("object_count_min")
         )
 
-    if filters.object_count_max is not None:
+    if "object_count_max" in active:
         query = query.join(Annotation, isouter=True).where(
-            Annotation.object_count <= filters.object_count_max
+            Annotation.object_count <= bindparam("object_count_max")
         )
 
     return query
@@ -104,21 +154,43 @@ def random_sample(
     Args:
         candidates: List of items to sample from
         count: Number of items to select
-        seed: Optional seed for reproducibility
+        seed: Optional seed for reproducibility; negative seeds are used by
+            absolute value, as ``random.seed`` does
 
     Returns:
         List of randomly selected items
     """
     if seed is not None:
-        random.seed(seed)
-    return random.sample(candidates, min(count, len(candidates)))
+        indices = _seeded_indices(len(candidates), count, abs(seed))
+    else:
+        indices = _pick_indices(len(candidates), count, None)
+    return [candidates[i] for i in indices]
+
+
+@functools.lru_cache(maxsize=32)
+def _seeded_indices(n: int, k: int, seed: int) -> tuple[int, ...]:
+    """Seeded picks depend only on (n, k, seed), so repeat draws are cached."""
+    return _pick_indices(n, k, seed)
+
+
+def _pick_indices(n: int, k: int, seed: int | None) -> tuple[int, ...]:
+    """Draw min(k, n) distinct indices from range(n) in random order.
+
+    Uses a PCG64-backed generator; for k much smaller than n numpy draws
+    without permuting the full range.
+    """
+    rng = np.random.default_rng(seed)
+    return tuple(rng.choice(n, size=min(k, n), replace=False).tolist())
 
 
 def sample_by_class_targets(
     candidates: list[Any],
     class_targets: dict[str, int],
 ) -> SamplingResult:
-    """Select samples to achieve class target counts using greedy algorithm.
+    """Select samples to achieve class target counts by stratified picking.
+
+    Candidates are bucketed per target class and drawn richest-first until
+    each class target is met, starting with the scarcest class.
 
     Args:
         candidates: List of samples with class_counts attribute
@@ -138,10 +210,6 @@ def sample_by_class_targets(
             total_selected=0,
         )
 
-    remaining = class_targets.copy()
-    selected = []
-    candidate_list = list(candidates)
-
     def get_class_counts(sample) -> dict[str, int]:
         """Get class counts from sample, handling different structures."""
         if hasattr(sample, "class_counts") and sample.class_counts:
@@ -150,44 +218,50 @@ def sample_by_class_targets(
             return sample.annotation.class_counts or {}
         return {}
 
-    def calculate_score(sample) -> float:
-        """Calculate contribution score for a sample."""
-        class_counts = get_class_counts(sample)
-        if not class_counts:
-            return 0.0
-        score = 0.0
-        for cls, target in remaining.items():
-            if target > 0:
-                contribution = min(class_counts.get(cls, 0), target)
-                score += contribution / target
-        return score
-
-    while any(v > 0 for v in remaining.values()) and candidate_list:
-        # Sort by score and select best
-        candidate_list.sort(key=calculate_score, reverse=True)
-
-        if calculate_score(candidate_list[0]) == 0:
-            break  # No more useful candidates
-
-        best = candidate_list.pop(0)
-        selected.append(best)
-
-        # Update remaining targets
-        class_counts = get_class_counts(best)
-        for cls, count in class_counts.items():
-            if cls in remaining:
-                remaining[cls] = max(0, remaining[cls] - count)
+    # counts[i, k]: instances of target class k in candidate i, stored
+    # column-major so each class's counts are contiguous for the per-class
+    # ranking and scans below.
+    classes = list(class_targets)
+    per_sample = [get_class_counts(sample) for sample in candidates]
+    counts = np.empty((len(candidates), len(classes)), dtype=np.int64, order="F")
+    for k, cls in enumerate(classes):
+        counts[:, k] = np.fromiter(
+            (class_counts.get(cls, 0) for class_counts in per_sample),
+            dtype=np.int64,
+            count=len(per_sample),
+        )
+
+    targets = np.array([class_targets[cls] for cls in classes], dtype=np.int64)
+    actual = np.zeros(len(classes), dtype=np.int64)
+    taken = np.zeros(len(candidates), dtype=bool)
+    selected_idx: list[int] = []
+
+    # Fill the scarcest classes first so their samples also count towards
+    # the common classes instead of being added on top of them.
+    for k in np.argsort(counts.sum(axis=0), kind="stable"):
+        if actual[k] >= targets[k]:
+            continue
+        column = counts[:, k]
+        # Candidates holding class k, richest first
+        order = np.argsort(-column, kind="stable")
+        for i in order[: np.count_nonzero(column > 0)]:
+            if actual[k] >= targets[k]:
+                break
+            if taken[i]:
+                continue
+            taken[i] = True
+            selected_idx.append(int(i))
+            actual += counts[i]
+
+    selected = [candidates[i] for i in selected_idx]
 
     # Calculate achievement
     achievement = {}
-    for cls, target in class_targets.items():
-        actual = sum(
-            get_class_counts(s).get(cls, 0) for s in selected
-        )
+    for k, (cls, target) in enumerate(class_targets.items()):
         achievement[cls] = ClassAchievement(
             target=target,
-            actual=actual,
-            status="achieved" if actual >= target else "partial",
+            actual=int(actual[k]),
+            status="achieved" if actual[k] >= target else "partial",
         )
 
     return SamplingResult(
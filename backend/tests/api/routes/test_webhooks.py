@@ -1,12 +1,14 @@
 """Tests for MinIO webhook event handling with Phase 3 enhancements."""
 
 import uuid
+from collections.abc import Generator
 from unittest.mock import MagicMock, patch
 
 import pytest
-from fastapi.testclient import TestClient
+from httpx import AsyncClient
 from sqlmodel import Session, select
 
+from app.api.deps import get_db
 from app.main import app
 from app.models import (
     Annotation,
@@ -18,49 +20,108 @@ from app.models import (
     SampleHistoryAction,
     SampleSource,
     SampleStatus,
-    User,
 )
+from tests.utils.utils import fresh_id
 
+pytestmark = pytest.mark.anyio
 
-@pytest.fixture
-def test_user(db: Session):
-    """Create a test user for webhooks."""
-    user_id = uuid.uuid4()
-    user = User(
-        id=user_id,
-        email=f"webhook_test_{user_id}@example.com",
-        hashed_password="fakehash",
-        full_name="Webhook Test User",
-        is_superuser=True,
+_VOC_XML_1PERSON = b"""<?xml version="1.0"?>
+<annotation>
+    <filename>sample_link.jpg</filename>
+    <size>
+        <width>1920</width>
+        <height>1080</height>
+    </size>
+    <object>
+        <name>person</name>
+        <bndbox>
+            <xmin>100</xmin>
+            <ymin>50</ymin>
+            <xmax>200</xmax>
+            <ymax>300</ymax>
+        </bndbox>
+    </object>
+</annotation>"""
+
+_VOC_XML_2PERSON_1CAR = b"""<?xml version="1.0"?>
+<annotation>
+    <filename>sample_link.jpg</filename>
+    <size>
+        <width>1280</width>
+        <height>720</height>
+    </size>
+    <object>
+        <name>person</name>
+        <bndbox>
+            <xmin>100</xmin>
+            <ymin>50</ymin>
+            <xmax>200</xmax>
+            <ymax>300</ymax>
+        </bndbox>
+    </object>
+    <object>
+        <name>car</name>
+        <bndbox>
+            <xmin>300</xmin>
+            <ymin>100</ymin>
+            <xmax>500</xmax>
+            <ymax>250</ymax>
+        </bndbox>
+    </object>
+    <object>
+        <name>person</name>
+        <bndbox>
+            <xmin>600</xmin>
+            <ymin>150</ymin>
+            <xmax>700</xmax>
+            <ymax>350</ymax>
+        </bndbox>
+    </object>
+</annotation>"""
+
+
+_SAMPLE_DEFAULTS = {
+    "bucket": "test-bucket",
+    "file_size": 12345,
+    "source": SampleSource.manual,
+    "status": SampleStatus.active,
+}
+
+
+def _make_sample(minio_instance: MinIOInstance, **overrides) -> Sample:
+    """Build a Sample owned by the instance owner, with overrides applied."""
+    return Sample(
+        id=fresh_id(),
+        minio_instance_id=minio_instance.id,
+        owner_id=minio_instance.owner_id,
+        **{**_SAMPLE_DEFAULTS, **overrides},
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    yield user
-    # Cleanup
-    db.delete(user)
-    db.commit()
 
 
 @pytest.fixture
-def test_minio_instance(db: Session, test_user: User):
-    """Create a test MinIO instance."""
-    instance = MinIOInstance(
-        id=uuid.uuid4(),
-        owner_id=test_user.id,
-        name="Test MinIO Webhook",
-        endpoint="127.0.0.1:9000",
-        access_key_encrypted="encrypted_minioadmin",
-        secret_key_encrypted="encrypted_minioadmin",
-        secure=False,
-    )
-    db.add(instance)
-    db.commit()
-    db.refresh(instance)
-    yield instance
-    # Cleanup
-    db.delete(instance)
-    db.commit()
+def db(db_transaction: Session) -> Session:
+    """Run each webhook test in a transaction that is rolled back afterwards.
+
+    Rows seeded by a test, and anything the webhook writes, disappear with the
+    rollback, so tests need no cleanup of their own.
+    """
+    return db_transaction
+
+
+@pytest.fixture(autouse=True)
+def share_db_session(db: Session):
+    """Serve webhook requests from the test session so setup rows only need a flush."""
+    previous = app.dependency_overrides.get(get_db)
+
+    def get_test_db() -> Generator[Session, None, None]:
+        yield db
+
+    app.dependency_overrides[get_db] = get_test_db
+    yield
+    if previous is None:
+        app.dependency_overrides.pop(get_db, None)
+    else:
+        app.dependency_overrides[get_db] = previous
 
 
 # =============================================================================
@@ -71,8 +132,8 @@ def test_minio_instance(db: Session, test_user: User):
 class TestWebhookImageCreated:
     """Tests for image file webhook events with Phase 3 enhancements."""
 
-    def test_image_created_extracts_file_stem(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+    async def test_image_created_extracts_file_stem(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
     ):
         """When an image is created via webhook, file_stem should be extracted."""
         payload = {
@@ -92,31 +153,23 @@ class TestWebhookImageCreated:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
 
         assert response.status_code == 200
+        data = response.json()
+        assert len(data["sample_ids"]) == 1
 
         # Verify file_stem was extracted
-        sample = db.exec(
-            select(Sample).where(
-                Sample.minio_instance_id == test_minio_instance.id,
-                Sample.object_key == "images/2024/01/sample001.jpg",
-            )
-        ).first()
+        sample = db.get(Sample, uuid.UUID(data["sample_ids"][0]))
 
         assert sample is not None
         assert sample.file_stem == "sample001"
 
-        # Cleanup
-        if sample:
-            db.delete(sample)
-            db.commit()
-
-    def test_image_created_uses_etag_as_file_hash(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+    async def test_image_created_uses_etag_as_file_hash(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
     ):
         """When an image is created, ETag should be used as file_hash for deduplication."""
         etag = "d41d8cd98f00b204e9800998ecf8427e"
@@ -137,50 +190,37 @@ class TestWebhookImageCreated:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
 
         assert response.status_code == 200
+        data = response.json()
+        assert len(data["sample_ids"]) == 1
 
-        sample = db.exec(
-            select(Sample).where(
-                Sample.minio_instance_id == test_minio_instance.id,
-                Sample.object_key == "images/sample_hash.jpg",
-            )
-        ).first()
+        sample = db.get(Sample, uuid.UUID(data["sample_ids"][0]))
 
         assert sample is not None
         assert sample.file_hash == etag
 
-        # Cleanup
-        if sample:
-            db.delete(sample)
-            db.commit()
-
-    def test_image_created_skips_duplicate_by_file_hash(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+    async def test_image_created_skips_duplicate_by_file_hash(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
     ):
         """When an image with same file_hash already exists, skip creation."""
         etag = "duplicate_hash_12345"
 
         # Create existing sample with same file_hash
-        existing_sample = Sample(
-            id=uuid.uuid4(),
-            minio_instance_id=test_minio_instance.id,
-            owner_id=test_minio_instance.owner_id,
-            bucket="test-bucket",
+        existing_sample = _make_sample(
+            test_minio_instance,
             object_key="images/old_sample.jpg",
             file_name="old_sample.jpg",
-            file_size=12345,
             file_hash=etag,
             file_stem="old_sample",
             source=SampleSource.webhook,
-            status=SampleStatus.active,
         )
         db.add(existing_sample)
-        db.commit()
+        db.flush()
 
         # Try to create new sample with same hash
         payload = {
@@ -200,7 +240,7 @@ class TestWebhookImageCreated:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
@@ -219,15 +259,11 @@ class TestWebhookImageCreated:
         assert len(samples) == 1
         assert samples[0].object_key == "images/old_sample.jpg"
 
-        # Cleanup
-        db.delete(existing_sample)
-        db.commit()
-
     @patch("app.api.routes.webhooks.find_and_link_annotation")
-    def test_image_created_triggers_annotation_matching(
+    async def test_image_created_triggers_annotation_matching(
         self,
         mock_find_annotation: MagicMock,
-        client: TestClient,
+        aclient: AsyncClient,
         db: Session,
         test_minio_instance: MinIOInstance,
     ):
@@ -249,7 +285,7 @@ class TestWebhookImageCreated:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
@@ -257,17 +293,6 @@ class TestWebhookImageCreated:
         assert response.status_code == 200
         mock_find_annotation.assert_called_once()
 
-        # Cleanup
-        sample = db.exec(
-            select(Sample).where(
-                Sample.minio_instance_id == test_minio_instance.id,
-                Sample.object_key == "images/sample_match.jpg",
-            )
-        ).first()
-        if sample:
-            db.delete(sample)
-            db.commit()
-
 
 # =============================================================================
 # Phase 3: Annotation Webhook Event Tests
@@ -277,27 +302,35 @@ class TestWebhookImageCreated:
 class TestWebhookAnnotationCreated:
     """Tests for annotation file (.xml) webhook events."""
 
-    def test_annotation_created_links_to_existing_sample(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+    @pytest.mark.parametrize(
+        "xml_blob, expected_width, expected_objects, expected_class_counts",
+        [
+            (_VOC_XML_1PERSON, 1920, 1, {"person": 1}),
+            (_VOC_XML_2PERSON_1CAR, 1280, 3, {"person": 2, "car": 1}),
+        ],
+    )
+    async def test_annotation_created_links_to_existing_sample(
+        self,
+        aclient: AsyncClient,
+        db: Session,
+        test_minio_instance: MinIOInstance,
+        xml_blob: bytes,
+        expected_width: int,
+        expected_objects: int,
+        expected_class_counts: dict[str, int],
     ):
         """When an annotation file is created, it should link to existing sample with same stem."""
         # Create existing image sample
-        image_sample = Sample(
-            id=uuid.uuid4(),
-            minio_instance_id=test_minio_instance.id,
-            owner_id=test_minio_instance.owner_id,
-            bucket="test-bucket",
+        image_sample = _make_sample(
+            test_minio_instance,
             object_key="images/sample_link.jpg",
             file_name="sample_link.jpg",
-            file_size=12345,
             file_stem="sample_link",
             file_hash="abc123_link",
             annotation_status=AnnotationStatus.none,
-            source=SampleSource.manual,
-            status=SampleStatus.active,
         )
         db.add(image_sample)
-        db.commit()
+        db.flush()
 
         # Webhook for annotation file
         payload = {
@@ -320,26 +353,10 @@ class TestWebhookAnnotationCreated:
         with patch("app.api.routes.webhooks.get_minio_client") as mock_get_client:
             # Mock MinIO client to return XML content
             mock_client = MagicMock()
-            mock_client.get_object.return_value.read.return_value = b"""<?xml version="1.0"?>
-<annotation>
-    <filename>sample_link.jpg</filename>
-    <size>
-        <width>1920</width>
-        <height>1080</height>
-    </size>
-    <object>
-        <name>person</name>
-        <bndbox>
-            <xmin>100</xmin>
-            <ymin>50</ymin>
-            <xmax>200</xmax>
-            <ymax>300</ymax>
-        </bndbox>
-    </object>
-</annotation>"""
+            mock_client.get_object.return_value.read.return_value = xml_blob
             mock_get_client.return_value = mock_client
 
-            response = client.post(
+            response = await aclient.post(
                 f"/api/v1/webhooks/minio/{test_minio_instance.id}",
                 json=payload,
             )
@@ -357,19 +374,12 @@ class TestWebhookAnnotationCreated:
         ).first()
         assert annotation is not None
         assert annotation.format == AnnotationFormat.voc
-        assert annotation.image_width == 1920
-        assert annotation.image_height == 1080
-        assert annotation.object_count == 1
-        assert annotation.class_counts == {"person": 1}
-
-        # Cleanup
-        if annotation:
-            db.delete(annotation)
-        db.delete(image_sample)
-        db.commit()
-
-    def test_annotation_created_ignored_when_no_matching_sample(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+        assert annotation.image_width == expected_width
+        assert annotation.object_count == expected_objects
+        assert annotation.class_counts == expected_class_counts
+
+    async def test_annotation_created_ignored_when_no_matching_sample(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
     ):
         """When an annotation file arrives but no matching image exists, it should be ignored."""
         payload = {
@@ -389,7 +399,7 @@ class TestWebhookAnnotationCreated:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
@@ -398,29 +408,23 @@ class TestWebhookAnnotationCreated:
         data = response.json()
         assert data["processed"] == 0  # No sample to link to
 
-    def test_annotation_created_detects_conflict(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+    async def test_annotation_created_detects_conflict(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
     ):
         """When annotation arrives for sample that already has different annotation, mark as conflict."""
         # Create existing image sample with an annotation
-        image_sample = Sample(
-            id=uuid.uuid4(),
-            minio_instance_id=test_minio_instance.id,
-            owner_id=test_minio_instance.owner_id,
-            bucket="test-bucket",
+        image_sample = _make_sample(
+            test_minio_instance,
             object_key="images/sample_conflict.jpg",
             file_name="sample_conflict.jpg",
-            file_size=12345,
             file_stem="sample_conflict",
             file_hash="abc123_conflict",
             annotation_key="labels/old_annotation.xml",
             annotation_hash="old_hash_123",
             annotation_status=AnnotationStatus.linked,
-            source=SampleSource.manual,
-            status=SampleStatus.active,
         )
         db.add(image_sample)
-        db.commit()
+        db.flush()
 
         # Webhook for new annotation file with different hash
         payload = {
@@ -440,7 +444,7 @@ class TestWebhookAnnotationCreated:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
@@ -462,36 +466,24 @@ class TestWebhookAnnotationCreated:
         assert "old_annotation.xml" in str(history.details)
         assert "sample_conflict.xml" in str(history.details)
 
-        # Cleanup
-        if history:
-            db.delete(history)
-        db.delete(image_sample)
-        db.commit()
-
-    def test_annotation_created_skips_duplicate_by_hash(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+    async def test_annotation_created_skips_duplicate_by_hash(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
     ):
         """When annotation with same hash already linked, skip processing."""
         annotation_hash = "same_hash_skip"
 
-        image_sample = Sample(
-            id=uuid.uuid4(),
-            minio_instance_id=test_minio_instance.id,
-            owner_id=test_minio_instance.owner_id,
-            bucket="test-bucket",
+        image_sample = _make_sample(
+            test_minio_instance,
             object_key="images/sample_skip.jpg",
             file_name="sample_skip.jpg",
-            file_size=12345,
             file_stem="sample_skip",
             file_hash="abc123_skip",
             annotation_key="labels/sample_skip.xml",
             annotation_hash=annotation_hash,
             annotation_status=AnnotationStatus.linked,
-            source=SampleSource.manual,
-            status=SampleStatus.active,
         )
         db.add(image_sample)
-        db.commit()
+        db.flush()
 
         # Webhook for same annotation file (same hash)
         payload = {
@@ -511,7 +503,7 @@ class TestWebhookAnnotationCreated:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
@@ -520,10 +512,6 @@ class TestWebhookAnnotationCreated:
         data = response.json()
         assert data["processed"] == 0  # Should be skipped (same hash)
 
-        # Cleanup
-        db.delete(image_sample)
-        db.commit()
-
 
 # =============================================================================
 # Phase 3: Object Removal Tests
@@ -533,24 +521,19 @@ class TestWebhookAnnotationCreated:
 class TestWebhookObjectRemoved:
     """Tests for object removal webhook events."""
 
-    def test_image_removed_soft_deletes_sample(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+    async def test_image_removed_soft_deletes_sample(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
     ):
         """When image file is deleted, sample should be soft-deleted."""
-        sample = Sample(
-            id=uuid.uuid4(),
-            minio_instance_id=test_minio_instance.id,
-            owner_id=test_minio_instance.owner_id,
-            bucket="test-bucket",
+        sample = _make_sample(
+            test_minio_instance,
             object_key="images/sample_delete.jpg",
             file_name="sample_delete.jpg",
-            file_size=12345,
             file_stem="sample_delete",
             source=SampleSource.webhook,
-            status=SampleStatus.active,
         )
         db.add(sample)
-        db.commit()
+        db.flush()
 
         payload = {
             "Records": [
@@ -564,46 +547,39 @@ class TestWebhookObjectRemoved:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
 
         assert response.status_code == 200
 
-        db.refresh(sample)
-        assert sample.status == SampleStatus.deleted
-        assert sample.deleted_at is not None
-
-        # Cleanup
-        db.delete(sample)
-        db.commit()
+        row = db.exec(
+            select(Sample.status, Sample.deleted_at).where(Sample.id == sample.id)
+        ).one()
+        assert row.status == SampleStatus.deleted
+        assert row.deleted_at is not None
 
-    def test_annotation_removed_clears_annotation_link(
-        self, client: TestClient, db: Session, test_minio_instance: MinIOInstance
+    async def test_annotation_removed_clears_annotation_link(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
     ):
         """When annotation file is deleted, clear annotation_key but keep sample."""
-        sample = Sample(
-            id=uuid.uuid4(),
-            minio_instance_id=test_minio_instance.id,
-            owner_id=test_minio_instance.owner_id,
-            bucket="test-bucket",
+        sample = _make_sample(
+            test_minio_instance,
             object_key="images/sample_ann_remove.jpg",
             file_name="sample_ann_remove.jpg",
-            file_size=12345,
             file_stem="sample_ann_remove",
             annotation_key="labels/sample_ann_remove.xml",
             annotation_hash="hash123_remove",
             annotation_status=AnnotationStatus.linked,
             source=SampleSource.webhook,
-            status=SampleStatus.active,
         )
         db.add(sample)
-        db.commit()
+        db.flush()
 
         # Also create the Annotation record
         annotation = Annotation(
-            id=uuid.uuid4(),
+            id=fresh_id(),
             sample_id=sample.id,
             format=AnnotationFormat.voc,
             image_width=1920,
@@ -611,7 +587,7 @@ class TestWebhookObjectRemoved:
             object_count=2,
         )
         db.add(annotation)
-        db.commit()
+        db.flush()
 
         payload = {
             "Records": [
@@ -625,20 +601,27 @@ class TestWebhookObjectRemoved:
             ]
         }
 
-        response = client.post(
+        response = await aclient.post(
             f"/api/v1/webhooks/minio/{test_minio_instance.id}",
             json=payload,
         )
 
         assert response.status_code == 200
 
-        db.refresh(sample)
+        row = db.exec(
+            select(
+                Sample.status,
+                Sample.annotation_key,
+                Sample.annotation_hash,
+                Sample.annotation_status,
+            ).where(Sample.id == sample.id)
+        ).one()
         # Sample should still be active
-        assert sample.status == SampleStatus.active
+        assert row.status == SampleStatus.active
         # But annotation link should be cleared
-        assert sample.annotation_key is None
-        assert sample.annotation_hash is None
-        assert sample.annotation_status == AnnotationStatus.none
+        assert row.annotation_key is None
+        assert row.annotation_hash is None
+        assert row.annotation_status == AnnotationStatus.none
 
         # Annotation record should be deleted
         remaining_annotation = db.exec(
@@ -646,6 +629,87 @@ class TestWebhookObjectRemoved:
         ).first()
         assert remaining_annotation is None
 
-        # Cleanup
-        db.delete(sample)
-        db.commit()
+    async def test_annotation_removed_reports_every_unlinked_sample(
+        self, aclient: AsyncClient, db: Session, test_minio_instance: MinIOInstance
+    ):
+        """Every sample sharing the removed annotation should be reported."""
+        samples = [
+            _make_sample(
+                test_minio_instance,
+                object_key=f"images/{name}/shared_ann.jpg",
+                file_name="shared_ann.jpg",
+                file_stem="shared_ann",
+                annotation_key="labels/shared_ann.xml",
+                annotation_status=AnnotationStatus.linked,
+                source=SampleSource.webhook,
+            )
+            for name in ("a", "b")
+        ]
+        db.add_all(samples)
+        db.flush()
+
+        payload = {
+            "Records": [
+                {
+                    "eventName": "s3:ObjectRemoved:Delete",
+                    "s3": {
+                        "bucket": {"name": "test-bucket"},
+                        "object": {"key": "labels/shared_ann.xml"},
+                    },
+                }
+            ]
+        }
+
+        response = await aclient.post(
+            f"/api/v1/webhooks/minio/{test_minio_instance.id}",
+            json=payload,
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["processed"] == 2
+        assert {uuid.UUID(i) for i in data["sample_ids"]} == {s.id for s in samples}
+
+
+# =============================================================================
+# Event Dispatch Tests
+# =============================================================================
+
+
+class TestWebhookEventDispatch:
+    """Tests for routing events by category and file kind."""
+
+    @pytest.mark.parametrize(
+        "event_name, object_key",
+        [
+            ("s3:ObjectAccessed:Get", "images/sample_dispatch.jpg"),
+            ("s3:ObjectCreated:Put", "docs/readme.txt"),
+        ],
+    )
+    async def test_unhandled_events_are_ignored(
+        self,
+        aclient: AsyncClient,
+        test_minio_instance: MinIOInstance,
+        event_name: str,
+        object_key: str,
+    ):
+        """Events outside create/remove, or for other file types, are skipped."""
+        payload = {
+            "Records": [
+                {
+                    "eventName": event_name,
+                    "s3": {
+                        "bucket": {"name": "test-bucket"},
+                        "object": {"key": object_key, "size": 1},
+                    },
+                }
+            ]
+        }
+
+        response = await aclient.post(
+            f"/api/v1/webhooks/minio/{test_minio_instance.id}",
+            json=payload,
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"processed": 0, "sample_ids": []}
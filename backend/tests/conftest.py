@@ -1,20 +1,59 @@
-from collections.abc import Generator
+import os
+import uuid
+from collections.abc import AsyncGenerator, Generator
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, delete
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, col, create_engine, delete, text
 
+from app.api.deps import get_db
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
-from app.models import Sample, User
+from app.models import MinIOInstance, Sample, User
 from tests.utils.user import authentication_token_from_email
 from tests.utils.utils import get_superuser_token_headers
 
 
+@pytest.fixture(scope="session")
+def test_engine() -> Generator[Engine, None, None]:
+    """
+    Return the engine tests run against.
+
+    Under pytest-xdist each worker gets its own Postgres schema, so the
+    session teardown in one worker can't delete rows another worker uses.
+    """
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker is None:
+        yield engine
+        return
+
+    schema = f"test_{worker}"
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    worker_engine = create_engine(
+        engine.url, connect_args={"options": f"-csearch_path={schema}"}
+    )
+    SQLModel.metadata.create_all(worker_engine)
+
+    def get_worker_db() -> Generator[Session, None, None]:
+        with Session(worker_engine) as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_worker_db
+    yield worker_engine
+    app.dependency_overrides.pop(get_db, None)
+    worker_engine.dispose()
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+
+
 @pytest.fixture(scope="session", autouse=True)
-def db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+def db(test_engine: Engine) -> Generator[Session, None, None]:
+    with Session(test_engine) as session:
         init_db(session)
         yield session
         statement = delete(Sample)
@@ -24,14 +63,97 @@ def db() -> Generator[Session, None, None]:
         session.commit()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture
+def db_transaction(test_engine: Engine) -> Generator[Session, None, None]:
+    """
+    Return a session joined into an outer transaction rolled back after the test.
+
+    The schema is created once per run; commits made by the test (or by
+    requests served from this session) only release a SAVEPOINT, so each test
+    starts from a clean state without DDL or cleanup deletes.
+    """
+    with test_engine.connect() as connection:
+        transaction = connection.begin()
+        session = Session(bind=connection, join_transaction_mode="create_savepoint")
+        yield session
+        session.close()
+        transaction.rollback()
+
+
+@pytest.fixture(scope="session")
+def test_user(test_engine: Engine) -> Generator[User, None, None]:
+    """Create a superuser shared by every test in the run.
+
+    Teardown deletes by id rather than by instance: the session-wide ``db``
+    cleanup may already have removed the row, and that is not an error.
+    """
+    user_id = uuid.uuid4()
+    user = User(
+        id=user_id,
+        email=f"test_{os.environ.get('PYTEST_XDIST_WORKER', 'gw0')}_{user_id}@example.com",
+        hashed_password="fakehash",
+        full_name="Test User",
+        is_superuser=True,
+    )
+    with Session(test_engine, expire_on_commit=False) as session:
+        session.add(user)
+        session.commit()
+        yield user
+        session.execute(delete(User).where(col(User.id) == user.id))
+        session.commit()
+
+
+@pytest.fixture(scope="session")
+def test_minio_instance(
+    test_engine: Engine, test_user: User
+) -> Generator[MinIOInstance, None, None]:
+    """Create a MinIO instance owned by ``test_user`` for the whole run."""
+    instance = MinIOInstance(
+        id=uuid.uuid4(),
+        owner_id=test_user.id,
+        name="Test MinIO",
+        endpoint="127.0.0.1:9000",
+        access_key_encrypted="encrypted_minioadmin",
+        secret_key_encrypted="encrypted_minioadmin",
+        secure=False,
+    )
+    with Session(test_engine, expire_on_commit=False) as session:
+        session.add(instance)
+        session.commit()
+        yield instance
+        session.execute(
+            delete(MinIOInstance).where(col(MinIOInstance.id) == instance.id)
+        )
+        session.commit()
+
+
+@pytest.fixture(scope="session")
 def client() -> Generator[TestClient, None, None]:
+    # The app is a module-level singleton, so one client (and one lifespan
+    # startup) serves the whole run; dependency overrides apply per request
     with TestClient(app) as c:
         yield c
 
 
-@pytest.fixture(scope="module")
-def superuser_token_headers(client: TestClient) -> dict[str, str]:
+@pytest.fixture(scope="session")
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+async def aclient() -> AsyncGenerator[AsyncClient, None]:
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def superuser_token_headers(
+    client: TestClient,
+    db: Session,  # noqa: ARG001
+) -> dict[str, str]:
+    # Depends on db so the superuser exists; the token is reused by every test
     return get_superuser_token_headers(client)
 
 
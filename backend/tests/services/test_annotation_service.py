@@ -1,5 +1,7 @@
 """Tests for AnnotationService VOC XML parsing."""
 
+from app.services.annotation_service import parse_voc_xml
+
 
 def test_parses_simple_voc_xml_with_single_object():
     """Parse VOC XML with one object and extract basic fields."""
@@ -23,8 +25,6 @@ def test_parses_simple_voc_xml_with_single_object():
 </annotation>
 """
 
-    from app.services.annotation_service import parse_voc_xml
-
     result = parse_voc_xml(xml_content)
 
     assert result is not None
@@ -82,8 +82,6 @@ def test_parses_voc_xml_with_multiple_objects_and_classes():
 </annotation>
 """
 
-    from app.services.annotation_service import parse_voc_xml
-
     result = parse_voc_xml(xml_content)
 
     assert result is not None
@@ -96,8 +94,6 @@ def test_returns_none_for_invalid_xml():
     """Return None when XML is malformed."""
     invalid_xml = b"<not-valid-xml"
 
-    from app.services.annotation_service import parse_voc_xml
-
     result = parse_voc_xml(invalid_xml)
 
     assert result is None
@@ -123,8 +119,6 @@ def test_handles_missing_optional_fields_gracefully():
 </annotation>
 """
 
-    from app.services.annotation_service import parse_voc_xml
-
     result = parse_voc_xml(xml_content)
 
     assert result is not None
@@ -132,3 +126,66 @@ def test_handles_missing_optional_fields_gracefully():
     assert result.image_width == 800
     assert result.image_height == 600
     assert result.object_count == 1
+
+
+def test_reads_bndbox_coordinates_regardless_of_child_order():
+    """Bounding box values are matched by tag, not by position."""
+    xml_content = b"""<?xml version="1.0"?>
+<annotation>
+  <object>
+    <name>cat</name>
+    <bndbox>
+      <xmax>30</xmax>
+      <xmin>10</xmin>
+      <ymax>40</ymax>
+      <ymin>20</ymin>
+    </bndbox>
+  </object>
+</annotation>
+"""
+
+    result = parse_voc_xml(xml_content)
+
+    assert result is not None
+    assert result.objects == [
+        {"class": "cat", "xmin": 10, "ymin": 20, "xmax": 30, "ymax": 40}
+    ]
+
+
+def test_ignores_nested_size_and_object_elements():
+    """Only size and objects directly under the root are read."""
+    xml_content = b"""<?xml version="1.0"?>
+<annotation>
+  <size>
+    <width>10</width>
+    <height>20</height>
+  </size>
+  <object>
+    <name>cat</name>
+    <size><width>99</width><height>99</height></size>
+    <bndbox>
+      <xmin>1</xmin>
+      <ymin>2</ymin>
+      <xmax>3</xmax>
+      <ymax>4</ymax>
+    </bndbox>
+  </object>
+  <objects>
+    <object>
+      <name>dog</name>
+      <bndbox>
+        <xmin>1</xmin>
+        <ymin>2</ymin>
+        <xmax>3</xmax>
+        <ymax>4</ymax>
+      </bndbox>
+    </object>
+  </objects>
+</annotation>
+"""
+
+    result = parse_voc_xml(xml_content)
+
+    assert result is not None
+    assert (result.image_width, result.image_height) == (10, 20)
+    assert result.class_counts == {"cat": 1}
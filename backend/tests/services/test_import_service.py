@@ -2,10 +2,31 @@
 
 import uuid
 from io import BytesIO
-from unittest.mock import MagicMock
+from unittest.mock import Mock
 
 import pytest
-
+from sqlmodel import Session, col, select
+
+from app.models import (
+    MinIOInstance,
+    Sample,
+    SampleHistory,
+    SampleHistoryAction,
+    SampleSource,
+    SampleTag,
+    Tag,
+)
+from app.services.import_service import (
+    ANNOTATION_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    CSVPreview,
+    ImportResult,
+    bulk_get_or_create_tags,
+    get_or_create_tag_by_path,
+    import_samples_from_csv,
+    preview_csv,
+)
+from app.services.minio_service import MinIOService
 
 # =============================================================================
 # Tests for preview_csv function
@@ -20,8 +41,6 @@ images/2024/01/sample002.jpg,"dog/husky"
 images/2024/01/sample003.png,
 """
 
-    from app.services.import_service import preview_csv
-
     result = preview_csv(BytesIO(csv_content))
 
     assert result.total_rows == 3
@@ -41,8 +60,6 @@ labels/sample002.xml,
 other/file.txt,
 """
 
-    from app.services.import_service import preview_csv
-
     result = preview_csv(BytesIO(csv_content))
 
     assert result.image_count == 3  # jpg, png, jpeg
@@ -62,8 +79,6 @@ images/row6.jpg,tag6
 images/row7.jpg,tag7
 """
 
-    from app.services.import_service import preview_csv
-
     result = preview_csv(BytesIO(csv_content))
 
     assert len(result.sample_rows) == 5
@@ -78,8 +93,6 @@ images/sample001.jpg,bucket1
 images/sample002.jpg,bucket2
 """
 
-    from app.services.import_service import preview_csv
-
     result = preview_csv(BytesIO(csv_content))
 
     assert result.has_tags_column is False
@@ -91,8 +104,6 @@ def test_preview_csv_handles_empty_file():
     csv_content = b"""object_key,tags
 """
 
-    from app.services.import_service import preview_csv
-
     result = preview_csv(BytesIO(csv_content))
 
     assert result.total_rows == 0
@@ -107,8 +118,6 @@ images/sample001.jpg,tag1
 """
     file = BytesIO(csv_content)
 
-    from app.services.import_service import preview_csv
-
     preview_csv(file)
 
     # File pointer should be reset to beginning
@@ -128,13 +137,42 @@ images/file.tiff
 images/file.tif
 """
 
-    from app.services.import_service import preview_csv
-
     result = preview_csv(BytesIO(csv_content))
 
     assert result.image_count == 8
 
 
+def test_preview_csv_estimates_counts_past_row_cap():
+    """Preview should extrapolate counts once the row cap is reached."""
+    rows = [
+        f"images/{i:05d}.jpg" if i % 4 else f"labels/{i:05d}.xml" for i in range(1000)
+    ]
+    csv_content = ("object_key\n" + "\n".join(rows) + "\n").encode()
+    file = BytesIO(csv_content)
+
+    result = preview_csv(file, max_preview_rows=100)
+
+    assert result.is_estimate is True
+    assert result.total_rows == 1000
+    assert result.image_count == 750
+    assert result.annotation_count == 250
+    assert len(result.sample_rows) == 5
+    assert file.read() == csv_content
+
+
+def test_preview_csv_exact_when_under_row_cap():
+    """Preview should report exact counts when the file fits in the cap."""
+    csv_content = b"""object_key
+images/a.jpg
+images/b.jpg
+"""
+
+    result = preview_csv(BytesIO(csv_content), max_preview_rows=2)
+
+    assert result.is_estimate is False
+    assert result.total_rows == 2
+
+
 # =============================================================================
 # Tests for ImportResult dataclass
 # =============================================================================
@@ -142,8 +180,6 @@ images/file.tif
 
 def test_import_result_default_values():
     """ImportResult should have correct default values."""
-    from app.services.import_service import ImportResult
-
     result = ImportResult()
 
     assert result.created == 0
@@ -156,8 +192,6 @@ def test_import_result_default_values():
 
 def test_import_result_can_be_modified():
     """ImportResult fields should be mutable."""
-    from app.services.import_service import ImportResult
-
     result = ImportResult()
     result.created = 10
     result.skipped = 5
@@ -181,17 +215,17 @@ def test_import_result_can_be_modified():
 
 def test_image_extensions_constant():
     """IMAGE_EXTENSIONS should contain all supported image formats."""
-    from app.services.import_service import IMAGE_EXTENSIONS
-
-    expected = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tiff", ".tif"}
+    expected = frozenset(
+        {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tiff", ".tif"}
+    )
     assert IMAGE_EXTENSIONS == expected
+    assert isinstance(IMAGE_EXTENSIONS, frozenset)
 
 
 def test_annotation_extensions_constant():
     """ANNOTATION_EXTENSIONS should contain .xml for VOC format."""
-    from app.services.import_service import ANNOTATION_EXTENSIONS
-
     assert ".xml" in ANNOTATION_EXTENSIONS
+    assert isinstance(ANNOTATION_EXTENSIONS, frozenset)
 
 
 # =============================================================================
@@ -201,8 +235,6 @@ def test_annotation_extensions_constant():
 
 def test_csv_preview_dataclass_fields():
     """CSVPreview should have all required fields."""
-    from app.services.import_service import CSVPreview
-
     preview = CSVPreview(
         total_rows=100,
         columns=["object_key", "tags"],
@@ -227,38 +259,19 @@ def test_csv_preview_dataclass_fields():
 
 def test_get_or_create_tag_by_path_creates_simple_tag():
     """Should create a simple tag without hierarchy."""
-    from app.services.import_service import get_or_create_tag_by_path
-
     # Mock session
-    mock_session = MagicMock()
-    mock_session.exec.return_value.first.return_value = None  # Tag doesn't exist
-
-    # Mock tag creation
-    mock_tag = MagicMock()
-    mock_tag.id = uuid.uuid4()
+    mock_session = Mock(spec=Session)
+    mock_session.exec.return_value.all.return_value = []  # Tag doesn't exist
 
     owner_id = uuid.uuid4()
     tag_cache: dict[str, uuid.UUID] = {}
 
-    # Patch Tag class to return our mock
-    with pytest.MonkeyPatch().context() as m:
-        from app import models
-
-        def mock_tag_init(**kwargs):
-            tag = MagicMock()
-            tag.id = uuid.uuid4()
-            tag.name = kwargs.get("name")
-            tag.parent_id = kwargs.get("parent_id")
-            return tag
-
-        m.setattr(models, "Tag", mock_tag_init)
-
-        result = get_or_create_tag_by_path(
-            session=mock_session,
-            owner_id=owner_id,
-            tag_path="simple_tag",
-            tag_cache=tag_cache,
-        )
+    result = get_or_create_tag_by_path(
+        session=mock_session,
+        owner_id=owner_id,
+        tag_path="simple_tag",
+        tag_cache=tag_cache,
+    )
 
     assert result is not None
     assert "simple_tag" in tag_cache
@@ -268,9 +281,7 @@ def test_get_or_create_tag_by_path_creates_simple_tag():
 
 def test_get_or_create_tag_by_path_uses_cache():
     """Should return cached tag ID if already processed."""
-    from app.services.import_service import get_or_create_tag_by_path
-
-    mock_session = MagicMock()
+    mock_session = Mock(spec=Session)
     owner_id = uuid.uuid4()
     cached_tag_id = uuid.uuid4()
     tag_cache = {"existing_tag": cached_tag_id}
@@ -289,9 +300,7 @@ def test_get_or_create_tag_by_path_uses_cache():
 
 def test_get_or_create_tag_by_path_strips_whitespace():
     """Should strip whitespace from tag path."""
-    from app.services.import_service import get_or_create_tag_by_path
-
-    mock_session = MagicMock()
+    mock_session = Mock(spec=Session)
     owner_id = uuid.uuid4()
     cached_tag_id = uuid.uuid4()
     tag_cache = {"trimmed": cached_tag_id}
@@ -306,6 +315,45 @@ def test_get_or_create_tag_by_path_strips_whitespace():
     assert result == cached_tag_id
 
 
+def test_bulk_get_or_create_tags_queries_once_per_level():
+    """Bulk helper should issue one SELECT and one flush per hierarchy level."""
+    mock_session = Mock(spec=Session)
+    mock_session.exec.return_value.all.return_value = []  # No tags exist yet
+    tag_cache: dict[str, uuid.UUID] = {}
+
+    result = bulk_get_or_create_tags(
+        session=mock_session,
+        owner_id=uuid.uuid4(),
+        tag_paths=["输电/山火", "输电/覆冰", " 已标注 ", "输电 / 山火"],
+        tag_cache=tag_cache,
+    )
+
+    assert mock_session.exec.call_count == 2
+    assert mock_session.flush.call_count == 2
+    assert mock_session.add.call_count == 4  # 输电, 已标注, 山火, 覆冰
+    assert set(result) == {"输电/山火", "输电/覆冰", "已标注", "输电 / 山火"}
+    assert result["输电 / 山火"] == result["输电/山火"] == tag_cache["输电/山火"]
+
+
+def test_bulk_get_or_create_tags_reuses_existing_tags():
+    """Bulk helper should map paths to existing tags without inserting."""
+    existing_id = uuid.uuid4()
+    mock_session = Mock(spec=Session)
+    mock_session.exec.return_value.all.return_value = [(existing_id, "已标注", None)]
+    tag_cache: dict[str, uuid.UUID] = {}
+
+    result = bulk_get_or_create_tags(
+        session=mock_session,
+        owner_id=uuid.uuid4(),
+        tag_paths=["已标注"],
+        tag_cache=tag_cache,
+    )
+
+    assert result == {"已标注": existing_id}
+    mock_session.add.assert_not_called()
+    mock_session.flush.assert_not_called()
+
+
 # =============================================================================
 # Tests for import validation
 # =============================================================================
@@ -313,12 +361,10 @@ def test_get_or_create_tag_by_path_strips_whitespace():
 
 def test_import_requires_object_key_column():
     """Import should raise error if object_key column is missing."""
-    from app.services.import_service import import_samples_from_csv
-
     csv_content = b"""bucket,tags
 bucket1,tag1
 """
-    mock_session = MagicMock()
+    mock_session = Mock(spec=Session)
 
     with pytest.raises(ValueError, match="Missing required column: object_key"):
         import_samples_from_csv(
@@ -327,3 +373,164 @@ bucket1,tag1
             minio_instance_id=uuid.uuid4(),
             owner_id=uuid.uuid4(),
         )
+
+
+# =============================================================================
+# Tests for the image import pass (requires database)
+# =============================================================================
+
+
+def test_import_inserts_samples_history_and_tags(
+    db_transaction: Session,
+    test_minio_instance: MinIOInstance,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Imported rows should be bulk inserted with history and tag links."""
+    db = db_transaction
+    owner_id = test_minio_instance.owner_id
+    for key, file_hash in (("images/existing.jpg", None), ("images/old.jpg", "h-dup")):
+        db.add(
+            Sample(
+                minio_instance_id=test_minio_instance.id,
+                owner_id=owner_id,
+                bucket="import-bucket",
+                object_key=key,
+                file_name=key.split("/")[-1],
+                file_size=1,
+                file_hash=file_hash,
+                source=SampleSource.manual,
+            )
+        )
+    db.flush()
+
+    etags = {
+        "images/a.jpg": "h-a",
+        "images/b.png": "h-b",
+        "images/existing.jpg": "h-existing",
+        "images/c.jpg": "h-dup",
+    }
+    monkeypatch.setattr(
+        MinIOService,
+        "get_object_stat",
+        lambda instance, bucket, object_key: {
+            "size": 10,
+            "etag": etags[object_key],
+            "content_type": "image/jpeg",
+        },
+    )
+    csv_content = """object_key,bucket,tags
+images/a.jpg,import-bucket,"输电/山火,已标注"
+images/b.png,import-bucket,已标注
+images/a.jpg,import-bucket,已标注
+images/existing.jpg,import-bucket,
+images/c.jpg,import-bucket,
+""".encode()
+
+    result = import_samples_from_csv(
+        session=db,
+        file=BytesIO(csv_content),
+        minio_instance_id=test_minio_instance.id,
+        owner_id=owner_id,
+    )
+
+    assert (result.created, result.skipped, result.errors) == (2, 3, 0)
+    assert result.tags_created == 3  # 输电, 输电/山火, 已标注
+    assert result.error_details == [
+        "Duplicate (hash): images/c.jpg matches images/old.jpg"
+    ]
+
+    samples = {
+        sample.object_key: sample
+        for sample in db.exec(
+            select(Sample).where(
+                Sample.owner_id == owner_id,
+                Sample.source == SampleSource.import_csv,
+            )
+        ).all()
+    }
+    assert set(samples) == {"images/a.jpg", "images/b.png"}
+    assert samples["images/a.jpg"].file_hash == "h-a"
+    assert samples["images/a.jpg"].file_stem == "a"
+    assert samples["images/b.png"].file_size == 10
+
+    sample_ids = [sample.id for sample in samples.values()]
+    history = db.exec(
+        select(SampleHistory.sample_id, SampleHistory.action).where(
+            col(SampleHistory.sample_id).in_(sample_ids)
+        )
+    ).all()
+    assert sorted(history) == sorted(
+        (sample_id, SampleHistoryAction.created) for sample_id in sample_ids
+    )
+
+    tag_names = db.exec(
+        select(SampleTag.sample_id, Tag.name)
+        .join(Tag)
+        .where(col(SampleTag.sample_id).in_(sample_ids))
+    ).all()
+    names_by_sample: dict[uuid.UUID, set[str]] = {}
+    for sample_id, name in tag_names:
+        names_by_sample.setdefault(sample_id, set()).add(name)
+    assert names_by_sample == {
+        samples["images/a.jpg"].id: {"山火", "已标注"},
+        samples["images/b.png"].id: {"已标注"},
+    }
+
+
+def test_import_records_bad_rows_without_failing_the_batch(
+    db_transaction: Session,
+    test_minio_instance: MinIOInstance,
+):
+    """A row the database rejects should be an error; the rest still import."""
+    db = db_transaction
+    too_long = "x" * 300  # content_type is limited to 255 characters
+    csv_content = f"""object_key,bucket,content_type
+images/ok1.jpg,import-bucket,image/jpeg
+images/bad.jpg,import-bucket,{too_long}
+images/ok2.jpg,import-bucket,image/jpeg
+""".encode()
+
+    result = import_samples_from_csv(
+        session=db,
+        file=BytesIO(csv_content),
+        minio_instance_id=test_minio_instance.id,
+        owner_id=test_minio_instance.owner_id,
+        validate_files=False,
+    )
+
+    assert (result.created, result.skipped, result.errors) == (2, 0, 1)
+    assert result.error_details[0].startswith("Error processing images/bad.jpg")
+    imported = db.exec(
+        select(Sample.object_key).where(
+            Sample.owner_id == test_minio_instance.owner_id,
+            Sample.source == SampleSource.import_csv,
+        )
+    ).all()
+    assert sorted(imported) == ["images/ok1.jpg", "images/ok2.jpg"]
+
+
+def test_import_retries_path_after_failed_first_occurrence(
+    db_transaction: Session,
+    test_minio_instance: MinIOInstance,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """A failed row should not make a later row with the same path a skip."""
+    stats = iter([None, {"size": 10, "etag": "h-retry", "content_type": None}])
+    monkeypatch.setattr(
+        MinIOService,
+        "get_object_stat",
+        lambda instance, bucket, object_key: next(stats),
+    )
+    csv_content = b"""object_key,bucket
+images/retry.jpg,import-bucket
+images/retry.jpg,import-bucket
+"""
+
+    result = import_samples_from_csv(
+        session=db_transaction,
+        file=BytesIO(csv_content),
+        minio_instance_id=test_minio_instance.id,
+        owner_id=test_minio_instance.owner_id,
+    )
+
+    assert (result.created, result.skipped, result.errors) == (1, 0, 1)
@@ -1,44 +1,67 @@
 """Tests for MatchingService - image and annotation file linking."""
 
 import uuid
-from unittest.mock import MagicMock
+from unittest.mock import Mock
 
-import pytest
+from minio import Minio
+from minio.datatypes import Object
+
+from app.models import Sample
+from app.services.matching_service import (
+    extract_file_stem,
+    find_annotation_for_image,
+)
 
 
 def test_finds_annotation_by_matching_file_stem():
     """Find annotation file for an image based on file_stem match."""
-    from app.services.matching_service import find_annotation_for_image
-
     # Create a mock sample
-    sample = MagicMock()
+    sample = Mock(spec=Sample)
     sample.file_stem = "sample001"
     sample.minio_instance_id = uuid.uuid4()
     sample.bucket = "test-bucket"
 
     # Create a mock MinIO client
-    mock_client = MagicMock()
+    mock_client = Mock(spec=Minio)
     # Simulate finding matching annotation file
     mock_client.list_objects.return_value = [
-        MagicMock(object_name="labels/sample001.xml")
+        Mock(spec=Object, object_name="labels/sample001.xml")
     ]
 
     result = find_annotation_for_image(sample, mock_client)
 
     assert result == "labels/sample001.xml"
-    # Verify list_objects was called with correct bucket
-    mock_client.list_objects.assert_called_once()
+    # Verify the whole bucket was listed recursively
+    mock_client.list_objects.assert_called_once_with(
+        bucket_name="test-bucket",
+        recursive=True,
+    )
+
+
+def test_finds_annotation_in_nested_directory():
+    """Find annotation files stored in nested directories."""
+    sample = Mock(spec=Sample)
+    sample.file_stem = "sample002"
+    sample.bucket = "test-bucket"
+
+    mock_client = Mock(spec=Minio)
+    mock_client.list_objects.return_value = [
+        Mock(spec=Object, object_name="images/2024/sample002.jpg"),
+        Mock(spec=Object, object_name="labels/2024/01/sample002.xml"),
+    ]
+
+    result = find_annotation_for_image(sample, mock_client)
+
+    assert result == "labels/2024/01/sample002.xml"
 
 
 def test_returns_none_when_no_annotation_found():
     """Return None when no matching annotation file exists."""
-    from app.services.matching_service import find_annotation_for_image
-
-    sample = MagicMock()
+    sample = Mock(spec=Sample)
     sample.file_stem = "sample999"
     sample.bucket = "test-bucket"
 
-    mock_client = MagicMock()
+    mock_client = Mock(spec=Minio)
     # No matching files
     mock_client.list_objects.return_value = []
 
@@ -49,10 +72,10 @@ def test_returns_none_when_no_annotation_found():
 
 def test_extracts_file_stem_from_filename():
     """Extract file stem (filename without extension) correctly."""
-    from app.services.matching_service import extract_file_stem
-
     assert extract_file_stem("sample001.jpg") == "sample001"
     assert extract_file_stem("image_123.png") == "image_123"
     assert extract_file_stem("path/to/file.jpeg") == "file"
     assert extract_file_stem("no_extension") == "no_extension"
     assert extract_file_stem("multi.dot.name.xml") == "multi.dot.name"
+    assert extract_file_stem("labels/.hidden") == ".hidden"
+    assert extract_file_stem("dir.v2/no_extension") == "no_extension"
@@ -1,13 +1,14 @@
 """Tests for sampling service."""
 
-import uuid
+import operator
+import random
 from collections.abc import Generator
-from datetime import date, datetime
+from datetime import datetime
 
 import pytest
-from sqlmodel import Session, select
+from sqlalchemy import Engine, insert
+from sqlmodel import Session, col, func, select
 
-from app.core.db import engine
 from app.models import (
     AnnotationStatus,
     FilterParams,
@@ -15,31 +16,47 @@ from app.models import (
     Sample,
     SampleSource,
     SampleStatus,
-    SampleTag,
-    Tag,
     User,
 )
 from app.services.sampling_service import (
+    _filter_query_template,
+    _seeded_indices,
     build_sample_filter_query,
     random_sample,
     sample_by_class_targets,
-    SamplingResult,
 )
+from tests.utils.utils import fresh_id
+
+# One timestamp per day of January 2024, shared by every seeded sample row
+_TEST_DATES = tuple(datetime(2024, 1, day) for day in range(1, 32))
 
 
 @pytest.fixture(scope="module")
-def db() -> Generator[Session, None, None]:
-    """Override the parent conftest db fixture to provide a real database session."""
-    with Session(engine) as session:
+def db(test_engine: Engine) -> Generator[Session, None, None]:
+    """Override the parent conftest db fixture to provide a real database session.
+
+    Bound to ``test_engine`` so that under pytest-xdist the rows live in the
+    worker's own schema. Everything runs inside one outer transaction that is
+    rolled back when the module finishes; fixture commits only release a
+    SAVEPOINT, so no cleanup deletes are needed.
+    """
+    # Unbounded per-module compiled cache, so no statement here is ever evicted
+    module_engine = test_engine.execution_options(compiled_cache={})
+    with module_engine.connect() as connection:
+        transaction = connection.begin()
+        session = Session(bind=connection, join_transaction_mode="create_savepoint")
         yield session
+        session.close()
+        transaction.rollback()
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def test_user(db: Session):
     """Create test user."""
+    user_id = fresh_id()
     user = User(
-        id=uuid.uuid4(),
-        email=f"sampling_test_{uuid.uuid4()}@example.com",
+        id=user_id,
+        email=f"sampling_test_{user_id}@example.com",
         hashed_password="fakehash",
         full_name="Sampling Test User",
         is_superuser=True,
@@ -47,16 +64,14 @@ def test_user(db: Session):
     db.add(user)
     db.commit()
     db.refresh(user)
-    yield user
-    db.delete(user)
-    db.commit()
+    return user
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def test_minio(db: Session, test_user: User):
     """Create test MinIO instance."""
     instance = MinIOInstance(
-        id=uuid.uuid4(),
+        id=fresh_id(),
         owner_id=test_user.id,
         name="Test MinIO Sampling",
         endpoint="127.0.0.1:9000",
@@ -67,93 +82,147 @@ def test_minio(db: Session, test_user: User):
     db.add(instance)
     db.commit()
     db.refresh(instance)
-    yield instance
-    db.delete(instance)
-    db.commit()
+    return instance
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def test_samples(db: Session, test_minio: MinIOInstance):
     """Create test samples."""
-    samples = []
-    for i in range(5):
-        sample = Sample(
-            id=uuid.uuid4(),
-            minio_instance_id=test_minio.id,
-            owner_id=test_minio.owner_id,
-            bucket="test-bucket",
-            object_key=f"images/sample_{i}.jpg",
-            file_name=f"sample_{i}.jpg",
-            file_size=1000,
-            file_stem=f"sample_{i}",
-            source=SampleSource.manual,
-            status=SampleStatus.active,
-            annotation_status=AnnotationStatus.linked if i % 2 == 0 else AnnotationStatus.none,
-            created_at=datetime(2024, 1, i + 1),
-        )
-        samples.append(sample)
-        db.add(sample)
-    db.commit()
-    yield samples
-    for s in samples:
-        db.delete(s)
+    # Plain rows in one executemany INSERT; no ORM state is needed to seed them
+    rows = [
+        {
+            "id": fresh_id(),
+            "minio_instance_id": test_minio.id,
+            "owner_id": test_minio.owner_id,
+            "bucket": "test-bucket",
+            "object_key": f"images/sample_{i}.jpg",
+            "file_name": f"sample_{i}.jpg",
+            "file_size": 1000,
+            "file_stem": f"sample_{i}",
+            "source": SampleSource.manual,
+            "status": SampleStatus.active,
+            "annotation_status": AnnotationStatus.linked
+            if i % 2 == 0
+            else AnnotationStatus.none,
+            "created_at": _TEST_DATES[i],
+            "updated_at": _TEST_DATES[i],
+        }
+        for i in range(5)
+    ]
+    db.execute(insert(Sample), rows)
     db.commit()
+    return db.exec(
+        select(Sample)
+        .where(col(Sample.id).in_([row["id"] for row in rows]))
+        .order_by(Sample.created_at)
+    ).all()
 
 
-class TestBuildSampleFilterQuery:
-    """Tests for build_sample_filter_query function."""
+# Tests derive filters from this instance instead of re-validating each one
+_EMPTY_FILTER = FilterParams()
 
-    def test_returns_all_active_samples_with_empty_filters(
-        self, db: Session, test_samples: list[Sample]
-    ):
-        """Empty filters should return all active samples."""
-        filters = FilterParams()
-        query = build_sample_filter_query(filters)
-        results = db.exec(query).all()
 
-        assert len(results) >= 5
+def _missing_filter(field: str):
+    """Mark a filter case whose field FilterParams does not support yet."""
+    return pytest.mark.xfail(reason=f"FilterParams has no {field} filter", strict=True)
 
-    def test_filters_by_minio_instance(
-        self, db: Session, test_samples: list[Sample], test_minio: MinIOInstance
-    ):
-        """Should filter by MinIO instance ID."""
-        filters = FilterParams(minio_instance_id=test_minio.id)
-        query = build_sample_filter_query(filters)
-        results = db.exec(query).all()
 
-        assert len(results) == 5
-        assert all(s.minio_instance_id == test_minio.id for s in results)
+def _count(db: Session, query) -> int:
+    """Count rows matched by a query without loading them."""
+    return db.scalar(select(func.count()).select_from(query.subquery()))
 
-    def test_filters_by_bucket(
-        self, db: Session, test_samples: list[Sample]
-    ):
-        """Should filter by bucket name."""
-        filters = FilterParams(bucket="test-bucket")
-        query = build_sample_filter_query(filters)
-        results = db.exec(query).all()
 
-        assert len(results) >= 5
-        assert all(s.bucket == "test-bucket" for s in results)
+def _column(db: Session, query, column) -> list:
+    """Fetch a single column of a query instead of full Sample objects."""
+    return db.scalars(query.with_only_columns(column)).all()
 
-    def test_filters_by_prefix(
-        self, db: Session, test_samples: list[Sample]
-    ):
-        """Should filter by object key prefix."""
-        filters = FilterParams(prefix="images/")
-        query = build_sample_filter_query(filters)
-        results = db.exec(query).all()
 
-        assert all(s.object_key.startswith("images/") for s in results)
+class TestBuildSampleFilterQuery:
+    """Tests for build_sample_filter_query function."""
 
-    def test_filters_by_annotation_status(
+    def test_returns_all_active_samples_with_empty_filters(
         self, db: Session, test_samples: list[Sample]
     ):
-        """Should filter by annotation status."""
-        filters = FilterParams(annotation_status=AnnotationStatus.linked)
+        """Empty filters should return all active samples."""
+        filters = _EMPTY_FILTER
         query = build_sample_filter_query(filters)
-        results = db.exec(query).all()
 
-        assert all(s.annotation_status == AnnotationStatus.linked for s in results)
+        assert _count(db, query) >= 5
+
+    @pytest.mark.parametrize(
+        ("field", "value", "column", "matches"),
+        [
+            pytest.param(
+                "annotation_status",
+                AnnotationStatus.linked,
+                Sample.annotation_status,
+                operator.eq,
+                id="annotation_status",
+            ),
+            pytest.param(
+                "minio_instance_id",
+                None,  # The module's MinIO instance, resolved in the test
+                Sample.minio_instance_id,
+                operator.eq,
+                id="minio_instance",
+                marks=_missing_filter("minio_instance_id"),
+            ),
+            pytest.param(
+                "bucket",
+                "test-bucket",
+                Sample.bucket,
+                operator.eq,
+                id="bucket",
+                marks=_missing_filter("bucket"),
+            ),
+            pytest.param(
+                "prefix",
+                "images/",
+                Sample.object_key,
+                str.startswith,
+                id="prefix",
+                marks=_missing_filter("prefix"),
+            ),
+        ],
+    )
+    def test_filters_by_field(
+        self,
+        db: Session,
+        test_samples: list[Sample],
+        test_minio: MinIOInstance,
+        field: str,
+        value,
+        column,
+        matches,
+    ):
+        """Should only return samples whose column matches the filter value."""
+        # model_copy skips validation, so guard against unknown fields
+        assert field in FilterParams.model_fields, f"FilterParams has no {field}"
+        if value is None:
+            value = test_minio.id
+        filters = _EMPTY_FILTER.model_copy(update={field: value})
+        results = _column(db, build_sample_filter_query(filters), column)
+
+        assert results
+        assert all(matches(result, value) for result in results)
+
+    def test_reuses_statement_for_same_filter_shape(self):
+        """Filters differing only in values should share one cached statement."""
+        build_sample_filter_query(
+            _EMPTY_FILTER.model_copy(
+                update={"annotation_status": AnnotationStatus.linked}
+            )
+        )
+        hits = _filter_query_template.cache_info().hits
+
+        query = build_sample_filter_query(
+            _EMPTY_FILTER.model_copy(
+                update={"annotation_status": AnnotationStatus.none}
+            )
+        )
+
+        assert _filter_query_template.cache_info().hits == hits + 1
+        assert query.compile().params["annotation_status"] == AnnotationStatus.none
 
 
 class TestRandomSample:
@@ -185,6 +254,33 @@ class TestRandomSample:
         result2 = random_sample(samples, 5, seed=123)
         assert result1 != result2
 
+    def test_negative_seed_is_accepted(self):
+        """Negative seeds should draw like their absolute value, not raise."""
+        samples = [f"sample_{i}" for i in range(10)]
+        result = random_sample(samples, 5, seed=-1)
+        assert result == random_sample(samples, 5, seed=1)
+
+    def test_does_not_touch_global_random_state(self):
+        """Seeding should not reseed the module-level random generator."""
+        random.seed(0)
+        expected = random.random()
+
+        random.seed(0)
+        random_sample(list(range(100)), 5, seed=42)
+
+        assert random.random() == expected
+
+    def test_seeded_draw_is_cached_by_size_and_seed(self):
+        """Repeat seeded draws over same-sized inputs should hit the cache."""
+        random_sample(list(range(50)), 5, seed=7)
+        hits = _seeded_indices.cache_info().hits
+
+        first = random_sample([f"a{i}" for i in range(50)], 5, seed=7)
+        second = random_sample([f"b{i}" for i in range(50)], 5, seed=7)
+
+        assert _seeded_indices.cache_info().hits == hits + 2
+        assert [s[1:] for s in first] == [s[1:] for s in second]
+
 
 class TestSampleByClassTargets:
     """Tests for sample_by_class_targets function."""
@@ -232,3 +328,42 @@ class TestSampleByClassTargets:
 
         assert result.total_selected == 0
         assert result.target_achievement["person"].actual == 0
+
+    def test_picks_richest_samples_per_class(self):
+        """Should draw the richest samples per class and skip useless ones."""
+
+        class MockSample:
+            def __init__(self, id, class_counts):
+                self.id = id
+                self.class_counts = class_counts
+
+        candidates = [
+            MockSample(1, {"dog": 40}),
+            MockSample(2, {"person": 5}),
+            MockSample(3, {"person": 60, "car": 20}),
+            MockSample(4, {"person": 50}),
+        ]
+
+        result = sample_by_class_targets(candidates, {"person": 100, "car": 20})
+
+        assert [s.id for s in result.selected_samples] == [3, 4]
+        assert result.target_achievement["person"].actual == 110
+        assert result.target_achievement["car"].status == "achieved"
+
+    def test_scarce_class_picks_count_towards_common_classes(self):
+        """Samples picked for a rare class should also fill common targets."""
+
+        class MockSample:
+            def __init__(self, id, class_counts):
+                self.id = id
+                self.class_counts = class_counts
+
+        candidates = [
+            MockSample(1, {"person": 100}),
+            MockSample(2, {"person": 90, "bike": 5}),
+        ]
+
+        result = sample_by_class_targets(candidates, {"person": 90, "bike": 5})
+
+        assert [s.id for s in result.selected_samples] == [2]
+        assert result.target_achievement["person"].status == "achieved"
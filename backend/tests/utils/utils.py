@@ -1,5 +1,8 @@
+import itertools
+import os
 import random
 import string
+import uuid
 
 from fastapi.testclient import TestClient
 
@@ -14,6 +17,23 @@ def random_email() -> str:
     return f"{random_lower_string()}@{random_lower_string()}.com"
 
 
+_ids = (
+    uuid.uuid5(
+        uuid.NAMESPACE_OID, f"{os.environ.get('PYTEST_XDIST_WORKER', 'gw0')}-{i}"
+    )
+    for i in itertools.count()
+)
+
+
+def fresh_id() -> uuid.UUID:
+    """Return the next deterministic test id for this run (and xdist worker).
+
+    The ids repeat on every run, so only use them for rows that are rolled
+    back; committed fixtures should use ``uuid.uuid4()``.
+    """
+    return next(_ids)
+
+
 def get_superuser_token_headers(client: TestClient) -> dict[str, str]:
     login_data = {
         "username": settings.FIRST_SUPERUSER,
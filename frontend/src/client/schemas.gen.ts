@@ -155,6 +155,11 @@ export const CSVPreviewResponseSchema = {
         annotation_count: {
             type: 'integer',
             title: 'Annotation Count'
+        },
+        is_estimate: {
+            type: 'boolean',
+            title: 'Is Estimate',
+            default: false
         }
     },
     type: 'object',
@@ -61,6 +61,7 @@ export type CSVPreviewResponse = {
     has_tags_column: boolean;
     image_count: number;
     annotation_count: number;
+    is_estimate?: boolean;
 };
 
 /**